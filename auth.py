@@ -1,18 +1,81 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from fastapi import HTTPException
 from jose import jwt
 from passlib.context import CryptContext
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from utils.metrics import span, run_in_context
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Hashes made with a different cost are flagged by needs_update() and upgraded on the next login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    with span("auth.hash_password"):
+        return pwd_context.hash(password)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("auth.verify_password"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    with span("auth.verify_password"):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
 
 def create_access_token(data: dict, role: str):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire, "role": role})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class PasswordHasher:
+    """Runs bcrypt on its own small pool so login spikes cannot exhaust the request threadpool."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats = {"pending": 0, "completed": 0, "rejected": 0}
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.stats["pending"] >= self.workers + self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(status_code=503, detail="Authentication service busy, please retry",
+                                    headers={"Retry-After": "1"})
+            self.stats["pending"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, run_in_context(fn), *args)
+        finally:
+            with self._lock:
+                self.stats["pending"] -= 1
+                self.stats["completed"] += 1
+
+    async def hash(self, password):
+        return await self._run(hash_password, password)
+
+    async def verify(self, password, hashed_password):
+        """Return (valid, new_hash); new_hash is set when the stored hash should be upgraded."""
+        valid, new_hash = await self._run(verify_and_update_password, password, hashed_password)
+        return valid, new_hash
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data["workers"] = self.workers
+        data["queue_depth"] = max(0, data["pending"] - self.workers)
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
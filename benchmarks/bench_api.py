@@ -0,0 +1,299 @@
+# Load test for the whole API: boots main.app in-process against a freshly seeded SQLite database,
+# with the fake AI backend (and a stub PDF converter for --renderer docx), runs each load profile
+# for --duration seconds with --concurrency virtual users, and writes per-endpoint p50/p95/p99
+# latency and throughput to a JSON file. Pass --compare with an earlier result to see regressions.
+# Usage: python -m benchmarks.bench_api --scale 1 --concurrency 16 --duration 10 --profiles browse,orders
+import os
+import io
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import date, datetime, timedelta
+
+PROFILES = ("login", "browse", "lists", "orders", "booking", "scans")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SEARCH_TERMS = ("tooth", "brush", "floss", "mint", "whiten", "ortho", "pediatric", "mumbai", "sensitiv", "charcol")
+
+
+def configure_environment(args, workdir):
+    # Must run before the app modules are imported: they read their settings at import time
+    os.environ.update(
+        DB_BACKEND="sqlite",
+        DB_NAME=args.db or os.path.join(workdir, "bench.sqlite3"),
+        AI_BACKEND="fake",
+        AI_FAKE_LATENCY=str(args.ai_latency),
+        REPORT_RENDERER=args.renderer,
+        REPORTS_DIR=os.path.join(workdir, "reports"),
+        DIAGNOSIS_CACHE_DIR="",
+        SLOW_REQUEST_MS="0",
+    )
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    # Every virtual user shares one client address, so the per-IP login limit would cap the storm at
+    # its burst; the per-account limit still applies
+    os.environ.setdefault("LOGIN_RATE_PER_IP", "1000000")
+    os.environ.setdefault("LOGIN_BURST_PER_IP", "1000000")
+
+
+def stub_pdf_converter():
+    from routers import scan_routes
+
+    def convert(docx_path, pdf_path):
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n%stub\n%%EOF\n")
+
+    scan_routes.convert_docx = convert
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(latency seconds, status)]
+
+    def add(self, endpoint, latency, status):
+        self.samples.setdefault(endpoint, []).append((latency, status))
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            statuses = {}
+            for _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for _, status in samples if status == "error" or status >= 500),
+                "statuses": statuses,
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {"duration_s": round(elapsed, 2), "requests": total,
+                "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+async def timed(client, recorder, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except Exception:
+        response, status = None, "error"
+    recorder.add(endpoint, time.perf_counter() - started, status)
+    return response
+
+
+# ---------- Load profiles: one iteration of a virtual user ----------
+
+async def login_storm(client, recorder, ctx, rng):
+    await timed(client, recorder, "POST /auth/token", "POST", "/auth/token",
+                data={"username": rng.choice(ctx["emails"]), "password": ctx["password"]})
+
+
+async def browse_catalog(client, recorder, ctx, rng):
+    await timed(client, recorder, "GET /products/", "GET", "/products/",
+                params={"limit": 20, "category": rng.choice(ctx["categories"])})
+    await timed(client, recorder, "GET /products/{product_id}", "GET", f"/products/{rng.choice(ctx['product_ids'])}")
+    await timed(client, recorder, "GET /doctors/", "GET", "/doctors/", params={"city": rng.choice(ctx["cities"])})
+    await timed(client, recorder, "GET /search/", "GET", "/search/", params={"q": rng.choice(SEARCH_TERMS)})
+
+
+async def read_lists(client, recorder, ctx, rng):
+    # Largest pages each list endpoint allows: serialization and compression dominate here
+    headers = rng.choice(ctx["auth_headers"])
+    await timed(client, recorder, "GET /products/?limit=200", "GET", "/products/",
+                params={"limit": 200, "cursor": rng.choice((0, 100, 300))})
+    await timed(client, recorder, "GET /doctors/?limit=200", "GET", "/doctors/", params={"limit": 200})
+    await timed(client, recorder, "GET /search/?limit=100", "GET", "/search/", params={"q": rng.choice(SEARCH_TERMS), "limit": 100})
+    await timed(client, recorder, "GET /orders/?limit=100", "GET", "/orders/", params={"limit": 100}, headers=headers)
+    await timed(client, recorder, "GET /appointments/", "GET", "/appointments/", headers=headers)
+
+
+async def place_orders(client, recorder, ctx, rng):
+    headers = {**rng.choice(ctx["auth_headers"]), "Idempotency-Key": uuid.uuid4().hex}
+    items = [{"product_id": pid, "quantity": rng.randint(1, 3)} for pid in rng.sample(ctx["product_ids"], rng.randint(1, 3))]
+    await timed(client, recorder, "POST /orders/", "POST", "/orders/", json={"items": items}, headers=headers)
+    await timed(client, recorder, "GET /orders/", "GET", "/orders/", params={"limit": 10}, headers=headers)
+
+
+async def book_appointments(client, recorder, ctx, rng):
+    doctor_id = rng.choice(ctx["doctor_ids"])
+    start = date.today() + timedelta(days=1)
+    response = await timed(client, recorder, "GET /appointments/availability/{doctor_id}", "GET",
+                           f"/appointments/availability/{doctor_id}",
+                           params={"start": start.isoformat(), "end": (start + timedelta(days=13)).isoformat()})
+    slots = response.json().get("slots") if response is not None and response.status_code == 200 else None
+    if slots:
+        # Concurrent users may pick the same slot; the loser's 409 is part of the workload
+        await timed(client, recorder, "POST /appointments/", "POST", "/appointments/",
+                    json={"doctor_id": doctor_id, "appointment_time": rng.choice(slots)},
+                    headers=rng.choice(ctx["auth_headers"]))
+
+
+async def upload_scans(client, recorder, ctx, rng):
+    from PIL import Image
+    files = []
+    for i in range(ctx["scan_images"]):
+        # A fresh image every time so the diagnosis cache never answers for the model
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), tuple(rng.randrange(256) for _ in range(3))).save(buffer, "JPEG")
+        files.append(("files", (f"scan{i}.jpg", buffer.getvalue(), "image/jpeg")))
+    await timed(client, recorder, "POST /scans/", "POST", "/scans/", files=files, headers=rng.choice(ctx["auth_headers"]))
+
+
+PROFILE_FUNCTIONS = {
+    "login": login_storm,
+    "browse": browse_catalog,
+    "lists": read_lists,
+    "orders": place_orders,
+    "booking": book_appointments,
+    "scans": upload_scans,
+}
+
+
+def load_context(args):
+    from db import get_connection
+    from auth import create_access_token
+    from benchmarks.seed import BENCH_PASSWORD
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    columns = {}
+    for name, query in (("emails", "SELECT email FROM users WHERE email LIKE '%@bench.local'"),
+                        ("product_ids", "SELECT id FROM products"),
+                        ("doctor_ids", "SELECT id FROM doctors"),
+                        ("categories", "SELECT DISTINCT category FROM products"),
+                        ("cities", "SELECT DISTINCT city FROM doctors")):
+        cursor.execute(query)
+        columns[name] = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    # Authenticated profiles skip the login round trip; the login profile measures that on its own
+    headers = [{"Authorization": "Bearer " + create_access_token({"sub": email}, "patient")}
+               for email in columns["emails"][:200]]
+    return {**columns, "auth_headers": headers, "password": BENCH_PASSWORD, "scan_images": args.scan_images}
+
+
+async def run_profile(app, name, args, ctx):
+    import httpx
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+    transport = httpx.ASGITransport(app=app)
+
+    async def virtual_user(index):
+        rng = random.Random(f"{args.seed}-{name}-{index}")
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            while time.perf_counter() < deadline:
+                await PROFILE_FUNCTIONS[name](client, recorder, ctx, rng)
+                # Responses served from memory never suspend over the in-process transport; yield
+                # like a network client would, or one user can hold the loop while others time out
+                await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+async def run_all(args):
+    import main
+    from benchmarks.seed import seed
+
+    counts = seed(os.environ["DB_NAME"], args.scale, args.seed)
+    if args.renderer == "docx":
+        stub_pdf_converter()
+    ctx = load_context(args)
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        for name in args.profiles:
+            results[name] = await run_profile(main.app, name, args, ctx)
+            print_profile(name, results[name])
+    return counts, results
+
+
+def print_profile(name, result):
+    print(f"\n[{name}] {result['requests']} requests in {result['duration_s']}s ({result['throughput_rps']} req/s)")
+    print(f"  {'endpoint':<46} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, e in result["endpoints"].items():
+        print(f"  {endpoint:<46} {e['throughput_rps']:>8} {e['p50_ms']:>8} {e['p95_ms']:>8} {e['p99_ms']:>8} {e['errors']:>7}")
+
+
+def compare(baseline_path, results):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for name, result in results.items():
+        before_profile = baseline["profiles"].get(name)
+        if not before_profile:
+            continue
+        for endpoint, after in result["endpoints"].items():
+            before = before_profile["endpoints"].get(endpoint)
+            if not before:
+                continue
+            p95 = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            rps = (after["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100 if before["throughput_rps"] else 0.0
+            print(f"  [{name}] {endpoint:<46} p95 {before['p95_ms']:>8} -> {after['p95_ms']:>8} ms ({p95:+.1f}%)"
+                  f"  req/s {before['throughput_rps']:>8} -> {after['throughput_rps']:>8} ({rps:+.1f}%)")
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_api")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help=f"comma-separated subset of {', '.join(PROFILES)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="seed data multiplier (see benchmarks/seed.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per profile")
+    parser.add_argument("--ai-latency", type=float, default=0.5, help="fake model latency per call")
+    parser.add_argument("--scan-images", type=int, default=1)
+    parser.add_argument("--renderer", choices=("native", "docx"), default="native")
+    parser.add_argument("--db", help="where to build the seeded database (default: a temp dir)")
+    parser.add_argument("--output", help=f"results JSON (default: {RESULTS_DIR}/api-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+    args.profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = set(args.profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        counts, results = asyncio.run(run_all(args))
+
+    commit = current_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"api-{commit or 'nocommit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "db")}
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+                   "python": sys.version.split()[0], "config": config, "seed_rows": counts,
+                   "profiles": results}, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main_cli()
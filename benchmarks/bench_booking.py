@@ -0,0 +1,73 @@
+# Many concurrent bookers racing for a handful of slots of one doctor. Every slot must end up
+# with exactly one active appointment. Books real rows, so point it at a scratch database.
+# Usage: DB_BACKEND=sqlite DB_NAME=bench.sqlite3 python -m benchmarks.bench_booking --bookers 200 --slots 5
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from fastapi import HTTPException
+from db import get_connection, async_connection
+from routers.appointments_routes import AppointmentRequest, book_appointment, load_schedule
+from utils.slots import open_slots
+
+
+async def book_all(args):
+    async with async_connection() as conn:
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute("SELECT id FROM users LIMIT 1")
+        user = await cursor.fetchone()
+        await cursor.close()
+        start = date.today() + timedelta(days=1)
+        windows, booked = await load_schedule(conn, args.doctor, start, start + timedelta(days=30))
+    slots = open_slots(windows, booked, start, start + timedelta(days=29))[:args.slots]
+    if not user or not slots:
+        raise SystemExit("Need a user and a doctor with free slots in the next 30 days")
+
+    rng = random.Random(1)
+    attempts = [rng.choice(slots) for _ in range(args.bookers)]
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def book(when):
+        async with in_flight:
+            try:
+                async with async_connection() as conn:
+                    await book_appointment(AppointmentRequest(doctor_id=args.doctor, appointment_time=when), user, conn)
+                return "booked"
+            except HTTPException as e:
+                return str(e.status_code)
+            except Exception as e:
+                return type(e).__name__
+
+    started = time.perf_counter()
+    outcomes = Counter(await asyncio.gather(*(book(when) for when in attempts)))
+    return slots, outcomes, time.perf_counter() - started
+
+
+def run(args):
+    slots, outcomes, elapsed = asyncio.run(book_all(args))
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    placeholders = ", ".join(["%s"] * len(slots))
+    cursor.execute(f"""
+        SELECT active_slot, COUNT(*) AS n FROM appointments
+        WHERE doctor_id = %s AND active_slot IN ({placeholders}) GROUP BY active_slot
+    """, (args.doctor, *slots))
+    per_slot = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    print(f"{args.bookers} attempts on {len(slots)} slots in {elapsed:.2f}s ({args.bookers / elapsed:.1f} req/s)")
+    print("outcomes:", dict(outcomes))
+    print("double-booked slots:", sum(1 for row in per_slot if row["n"] > 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctor", type=int, default=1)
+    parser.add_argument("--bookers", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    run(parser.parse_args())
@@ -0,0 +1,47 @@
+# Per-report DOCX render time and memory: fresh DocxTemplate per report vs. the precompiled template.
+# Usage: python -m benchmarks.bench_docx_template --reports 50
+import argparse
+import time
+import tracemalloc
+from io import BytesIO
+from docxtpl import DocxTemplate, InlineImage
+from docx.shared import Inches
+from utils.report_template import CompiledDocxTemplate
+from benchmarks.bench_report_render import TEMPLATE_PATH, CONTEXT, thumbnails
+
+
+def render_once(doc, images):
+    context = dict(CONTEXT)
+    for i in range(5):
+        context[f"image_{i + 1}"] = InlineImage(doc, BytesIO(images[i]), width=Inches(2)) if i < len(images) else ""
+    doc.render(context)
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def measure(label, make_doc, images, reports):
+    render_once(make_doc(), images)  # warm-up
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(reports):
+        render_once(make_doc(), images)
+    elapsed = (time.perf_counter() - started) / reports
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24}{elapsed * 1000:8.1f} ms/report   peak {peak / 1024 / 1024:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=30)
+    parser.add_argument("--images", type=int, default=3)
+    args = parser.parse_args()
+
+    images = thumbnails(args.images)
+    measure("DocxTemplate(path)", lambda: DocxTemplate(TEMPLATE_PATH), images, args.reports)
+
+    started = time.perf_counter()
+    compiled = CompiledDocxTemplate(TEMPLATE_PATH)
+    print(f"{'precompile (once)':<24}{(time.perf_counter() - started) * 1000:8.1f} ms")
+    measure("CompiledDocxTemplate", compiled.new, images, args.reports)
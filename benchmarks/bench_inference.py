@@ -0,0 +1,33 @@
+# Offline latency/throughput benchmark for the scan inference client.
+# Usage: python -m benchmarks.bench_inference --images 5 --scans 20 --latency 0.5
+import argparse
+import asyncio
+import time
+from utils.inference import FakeBackend, InferenceClient, CircuitBreaker
+
+
+async def run(args):
+    backend = FakeBackend(latency=args.latency)
+    parts = [{"mime_type": "image/png", "data": b""}] * args.images
+    results = {}
+
+    serial = InferenceClient(backend, concurrency=1, retries=0, breaker=CircuitBreaker())
+    concurrent = InferenceClient(backend, concurrency=args.concurrency, retries=0, breaker=CircuitBreaker())
+    batched = InferenceClient(backend, concurrency=args.concurrency, retries=0, batch=True, breaker=CircuitBreaker())
+
+    for name, client in [("serial", serial), ("concurrent", concurrent), ("batched", batched)]:
+        started = time.perf_counter()
+        await asyncio.gather(*(client.analyze("prompt", parts) for _ in range(args.scans)))
+        elapsed = time.perf_counter() - started
+        results[name] = elapsed
+        print(f"{name:<11} {elapsed:7.2f}s total  {args.scans / elapsed:7.2f} scans/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--scans", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,126 @@
+# Orders/sec for the legacy per-item order insert vs the batched, transactional create_order.
+# Runs against the configured database (DB_BACKEND/DB_NAME/...), which must already hold the
+# schema, at least one user and some products. --rtt adds a per-statement delay to stand in
+# for the network round trip to a remote MySQL when benchmarking against local SQLite.
+# Usage: DB_BACKEND=sqlite DB_NAME=bench.sqlite3 python -m benchmarks.bench_orders --orders 500 --items 5 --rtt 0.001
+import argparse
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db import get_connection, AsyncConnection
+from schemas import OrderCreate
+from routers.orders_routes import create_order
+
+
+class _SlowCursor:
+    def __init__(self, cursor, rtt):
+        self._cursor = cursor
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, *args):
+        time.sleep(self._rtt)
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        time.sleep(self._rtt)
+        return self._cursor.executemany(*args)
+
+
+class _SlowConnection:
+    def __init__(self, conn, rtt):
+        self._conn = conn
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, dictionary=False):
+        return _SlowCursor(self._conn.cursor(dictionary=dictionary), self._rtt)
+
+    def commit(self):
+        time.sleep(self._rtt)
+        self._conn.commit()
+
+
+def legacy_create_order(order, user, conn):
+    # The handler as it was before: client prices, one INSERT per line item
+    cursor = conn.cursor(dictionary=True)
+    items = order["items"]
+    total_price = sum(item["quantity"] * item["price"] for item in items)
+    cursor.execute("INSERT INTO orders (user_id, total_price, status) VALUES (%s, %s, %s)",
+                   (user["id"], total_price, "pending"))
+    order_id = cursor.lastrowid
+    for item in items:
+        cursor.execute("""
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+        """, (order_id, item["product_id"], item["quantity"], item["price"]))
+    conn.commit()
+    cursor.close()
+
+
+def load_fixtures():
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id FROM users LIMIT 1")
+    user = cursor.fetchone()
+    cursor.execute("SELECT id, price FROM products")
+    products = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    if not user or not products:
+        raise SystemExit("The database needs at least one user and one product")
+    return user, products
+
+
+def run(args):
+    user, products = load_fixtures()
+    rng = random.Random(7)
+    orders = []
+    for _ in range(args.orders):
+        lines = rng.sample(products, min(args.items, len(products)))
+        orders.append([{"product_id": p["id"], "quantity": rng.randint(1, 3), "price": float(p["price"])} for p in lines])
+
+    def legacy(items):
+        conn = get_connection()
+        try:
+            legacy_create_order({"items": items}, user, _SlowConnection(conn, args.rtt))
+        finally:
+            conn.close()
+
+    def run_legacy():
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(legacy, orders))
+
+    async def batched_all():
+        # The handler is async: --concurrency orders in flight on one event loop
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def batched(items):
+            async with slots:
+                conn = await asyncio.to_thread(get_connection)
+                try:
+                    await create_order(OrderCreate(items=items), None, user, AsyncConnection(_SlowConnection(conn, args.rtt)))
+                finally:
+                    conn.close()
+
+        await asyncio.gather(*(batched(items) for items in orders))
+
+    for name, fn in [("legacy", run_legacy), ("batched", lambda: asyncio.run(batched_all()))]:
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<8} {elapsed:7.2f}s  {args.orders / elapsed:8.1f} orders/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rtt", type=float, default=0.0, help="seconds added per statement")
+    run(parser.parse_args())
@@ -0,0 +1,73 @@
+# Compares the native PDF renderer with the DocxTemplate (+ office conversion) report path.
+# Usage: python -m benchmarks.bench_report_render --reports 20 [--convert]
+import os
+import time
+import argparse
+import tempfile
+from io import BytesIO
+from PIL import Image as PILImage
+from docxtpl import DocxTemplate, InlineImage
+from docx.shared import Inches
+from utils.pdf_report import NativeReportTemplate, convert_docx, shutdown_converter
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "..", "templates", "scan_report_template.docx")
+
+CONTEXT = {
+    "first_name": "Test", "last_name": "User", "email": "testuser@example.com", "gender": "M",
+    "date_of_birth": "2000-01-01", "age": 25, "contact_number": "9999999999", "address": "Mumbai",
+    "symptoms": "tooth_pain", "previous_treatments": "root_canal", "brushing_frequency": "Twice daily",
+    "tobacco_use": "No", "condition": "Gingivitis", "severity": "40%",
+    "info": "Inflammation of the gums caused by plaque accumulation. " * 10,
+    "remedy": "Warm salt water rinses twice daily. " * 5,
+    "diet": "Reduce sugary snacks and increase leafy greens. " * 5,
+    "action": "Schedule a routine dental consultation within two weeks.",
+}
+
+
+def thumbnails(count):
+    result = []
+    for i in range(count):
+        buffer = BytesIO()
+        PILImage.new("RGB", (600, 450), (40 * i, 120, 200)).save(buffer, format="JPEG")
+        result.append(buffer.getvalue())
+    return result
+
+
+def bench_native(template, images, reports):
+    started = time.perf_counter()
+    for _ in range(reports):
+        template.render(dict(CONTEXT), images)
+    return (time.perf_counter() - started) / reports
+
+
+def bench_docx(images, reports, workdir, do_convert):
+    started = time.perf_counter()
+    for n in range(reports):
+        doc = DocxTemplate(TEMPLATE_PATH)
+        context = dict(CONTEXT)
+        for i in range(5):
+            context[f"image_{i + 1}"] = InlineImage(doc, BytesIO(images[i]), width=Inches(2)) if i < len(images) else ""
+        doc.render(context)
+        docx_path = os.path.join(workdir, f"report_{n}.docx")
+        doc.save(docx_path)
+        if do_convert:
+            convert_docx(docx_path, docx_path.replace(".docx", ".pdf"))
+    return (time.perf_counter() - started) / reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=20)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--convert", action="store_true", help="also convert DOCX to PDF (needs Word or LibreOffice)")
+    args = parser.parse_args()
+
+    images = thumbnails(args.images)
+    started = time.perf_counter()
+    template = NativeReportTemplate(TEMPLATE_PATH)
+    print(f"native template parse (once): {(time.perf_counter() - started) * 1000:8.1f} ms")
+    print(f"native PDF render:            {bench_native(template, images, args.reports) * 1000:8.1f} ms/report")
+    with tempfile.TemporaryDirectory() as workdir:
+        label = "docx render + convert:" if args.convert else "docx render (no convert):"
+        print(f"{label:<30}{bench_docx(images, args.reports, workdir, args.convert) * 1000:8.1f} ms/report")
+    shutdown_converter()
@@ -0,0 +1,94 @@
+# Checks the scan output parser against the recorded corpus and times it against the old
+# exact-heading parser. Exits non-zero if any corpus case parses differently than expected.
+# Usage: python -m benchmarks.bench_scan_parser --repeat 2000
+import os
+import sys
+import json
+import time
+import argparse
+from utils.scan_parser import parse_scan
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "scan_outputs.json")
+LEGACY_HEADINGS = (
+    "Dental Condition Name", "Information About the Condition", "Severity Percentage",
+    "Home Cure or Remedy", "Dietary Options or Food Solutions", "Call for Action",
+)
+
+
+def legacy_parse(texts):
+    # The previous behaviour: every image concatenated, headings matched by exact line equality
+    full_text = ""
+    for idx, text in enumerate(texts):
+        full_text += f"\n--- Analysis for Image {idx + 1} ---\n{text}\n"
+    sections = {heading: "" for heading in LEGACY_HEADINGS}
+    current = None
+    for line in full_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line in sections:
+            current = line
+        elif current:
+            sections[current] += line + " "
+    return sections
+
+
+def mismatches(findings, expected):
+    problems = []
+    for field, value in expected.items():
+        if field == "images":
+            if len(findings.images) != len(value):
+                problems.append(f"images: {len(findings.images)} parsed, {len(value)} expected")
+                continue
+            for i, image_expected in enumerate(value):
+                for image_field, image_value in image_expected.items():
+                    actual = getattr(findings.images[i], image_field)
+                    if actual != image_value:
+                        problems.append(f"images[{i}].{image_field}: {actual!r} != {image_value!r}")
+        elif getattr(findings, field) != value:
+            problems.append(f"{field}: {getattr(findings, field)!r} != {value!r}")
+    return problems
+
+
+def timed(fn, cases, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            fn(case["outputs"])
+    return (time.perf_counter() - started) / (repeat * len(cases)) * 1e6
+
+
+def run(args):
+    with open(args.corpus) as f:
+        cases = json.load(f)
+
+    failures = 0
+    for case in cases:
+        problems = mismatches(parse_scan(case["outputs"]), case["expected"])
+        print(f"{'ok' if not problems else 'FAIL':<5} {case['name']}")
+        for problem in problems:
+            print(f"      {problem}")
+        failures += bool(problems)
+    print(f"{len(cases) - failures}/{len(cases)} corpus cases parsed as expected")
+
+    legacy_ok = sum(
+        1 for case in cases
+        if legacy_parse(case["outputs"])["Dental Condition Name"].strip() == case["expected"].get("condition")
+    )
+    print(f"legacy parser gets the condition right in {legacy_ok}/{len(cases)} cases")
+
+    print(f"parse_scan    {timed(parse_scan, cases, args.repeat):8.1f} us/scan")
+    print(f"legacy_parse  {timed(legacy_parse, cases, args.repeat):8.1f} us/scan")
+    # Output that follows the prompt exactly takes parse_scan's line-lookup fast path
+    canonical = [case for case in cases if case["name"] == "canonical headings"]
+    if canonical:
+        print(f"canonical     {timed(parse_scan, canonical, args.repeat):8.1f} us/scan parse_scan, "
+              f"{timed(legacy_parse, canonical, args.repeat):.1f} us/scan legacy")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=500)
+    sys.exit(1 if run(parser.parse_args()) else 0)
@@ -0,0 +1,75 @@
+# Build/query/update benchmark for the in-process search index on synthetic rows.
+# Usage: python -m benchmarks.bench_search --rows 100000 --queries 2000
+import argparse
+import random
+import statistics
+import time
+from utils.search import SearchIndex, PRODUCT_FIELDS, PRODUCT_SUMMARY, DOCTOR_FIELDS, DOCTOR_SUMMARY
+
+WORDS = ("tooth brush paste floss mouthwash whitening strips electric sonic charcoal mint fluoride kids "
+         "sensitive gum care orthodontic retainer cleaner tongue scraper water flosser travel bamboo soft "
+         "medium hard refill heads enamel repair fresh breath herbal natural clinical pro ultra").split()
+CATEGORIES = ["Oral Care", "Whitening", "Orthodontics", "Kids", "Accessories"]
+FIRST = ["John", "Sarah", "Priya", "Rahul", "Anita", "Vikram", "Meera", "Arjun", "Kavya", "Rohan"]
+LAST = ["Doe", "Lee", "Sharma", "Patel", "Iyer", "Khan", "Reddy", "Nair", "Gupta", "Mehta"]
+SPECIALTIES = ["General Dentistry", "Pediatric Dentistry", "Orthodontics", "Periodontics", "Endodontics", "Oral Surgery"]
+CITIES = ["Mumbai", "Delhi", "Pune", "Bengaluru", "Chennai", "Hyderabad", "Kolkata", "Jaipur"]
+QUERIES = ["tooth brush", "whitening", "kids paste", "electr", "flosr", "orthodontics pune", "sharma", "pediatric",
+           "sensitive toothpaste", "gum care mint", "Reddy chennai", "charcol"]
+
+
+def make_rows(n, rng):
+    products, doctors = [], []
+    for i in range(1, n + 1):
+        if i % 4:
+            products.append({
+                "id": i, "name": " ".join(rng.sample(WORDS, 3)).title() + f" {i}",
+                "description": " ".join(rng.choices(WORDS, k=20)), "category": rng.choice(CATEGORIES),
+                "price": round(rng.uniform(50, 5000), 2), "image_url": f"p{i}.png",
+            })
+        else:
+            doctors.append({
+                "id": i, "first_name": rng.choice(FIRST), "last_name": rng.choice(LAST),
+                "specialty": rng.choice(SPECIALTIES), "city": rng.choice(CITIES), "languages": "English,Hindi",
+                "short_bio": " ".join(rng.choices(WORDS, k=10)), "rating": round(rng.uniform(3, 5), 1), "profile_image": None,
+            })
+    return products, doctors
+
+
+def percentile(values, pct):
+    return sorted(values)[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(args):
+    rng = random.Random(42)
+    products, doctors = make_rows(args.rows, rng)
+
+    started = time.perf_counter()
+    index = SearchIndex()
+    for row in products:
+        index.upsert("product", row["id"], row, PRODUCT_FIELDS, PRODUCT_SUMMARY)
+    for row in doctors:
+        index.upsert("doctor", row["id"], row, DOCTOR_FIELDS, DOCTOR_SUMMARY)
+    print(f"build      {time.perf_counter() - started:7.2f}s  {len(index)} docs, {len(index.vocabulary)} terms")
+
+    latencies = []
+    for i in range(args.queries):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        index.search(query, limit=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"query      p50 {statistics.median(latencies):6.2f}ms  p95 {percentile(latencies, 95):6.2f}ms  "
+          f"p99 {percentile(latencies, 99):6.2f}ms")
+
+    started = time.perf_counter()
+    for row in rng.sample(products, min(1000, len(products))):
+        index.upsert("product", row["id"], dict(row, name=row["name"] + " v2"), PRODUCT_FIELDS, PRODUCT_SUMMARY)
+    elapsed = time.perf_counter() - started
+    print(f"update     {elapsed / min(1000, len(products)) * 1000:6.3f}ms per upsert")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    run(parser.parse_args())
@@ -0,0 +1,257 @@
+# Query plan check: boots main.app against a freshly migrated and seeded SQLite database, calls
+# every endpoint that touches the database once (as a patient and as an admin), then EXPLAINs each
+# distinct statement that ran and fails if one reads a whole table without being on the allowlist.
+# Point DB_BACKEND/DB_* at a migrated MySQL copy with --use-env-db to check the production plans.
+# Usage: python -m benchmarks.check_query_plans [--scale 1] [--verbose]
+import os
+import io
+import re
+import sys
+import uuid
+import asyncio
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+# Statements expected to read a whole table, with the reason; matched against the whitespace-
+# normalised query
+ALLOWED_FULL_SCANS = (
+    (r"^SELECT .+ FROM products$",
+     "catalog snapshot and search index load every product once, then serve reads from memory"),
+    (r"^SELECT .+ FROM doctors$",
+     "search index loads every doctor once"),
+    (r"^SELECT .+ FROM doctors (WHERE (rating >= %s|CONCAT\(.+\) LIKE %s|rating >= %s AND CONCAT\(.+\) LIKE %s) )?"
+     r"ORDER BY id LIMIT %s$",
+     "doctor page without an equality filter walks the primary key in page order and stops after LIMIT matches"),
+)
+
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def normalise(query):
+    return " ".join(query.split())
+
+
+def allowed_reason(query):
+    for pattern, reason in ALLOWED_FULL_SCANS:
+        if re.search(pattern, query):
+            return reason
+    return None
+
+
+def explain(conn, backend, query, params):
+    """Tables the statement reads in full, from EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (MySQL)."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if backend == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            plan = [row["detail"] for row in cursor.fetchall()]
+            full = [m.group(1) for m in map(_SQLITE_FULL_SCAN.match, plan) if m]
+        else:
+            cursor.execute("EXPLAIN " + query, params)
+            rows = cursor.fetchall()
+            plan = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+            full = [row["table"] for row in rows if row["type"] == "ALL"]
+    finally:
+        cursor.close()
+    return full, plan
+
+
+async def exercise(app, ctx):
+    """One call to each route that reaches the database; returns the non-2xx responses."""
+    import httpx
+    from PIL import Image
+
+    patient, admin = ctx["patient_headers"], ctx["admin_headers"]
+    doctor_id, product_id = ctx["doctor_id"], ctx["product_id"]
+    tomorrow = date.today() + timedelta(days=1)
+    failures = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check", timeout=60) as client:
+        async def call(method, url, expect=(200,), **kwargs):
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in expect:
+                failures.append(f"{method} {url} -> {response.status_code} {response.text[:200]}")
+            return response
+
+        # Authentication and profile
+        email = f"plan-{uuid.uuid4().hex[:8]}@check.local"
+        await call("POST", "/auth/register", json={"email": email, "password": ctx["password"],
+                                                   "first_name": "Plan", "last_name": "Check"})
+        await call("POST", "/auth/token", data={"username": ctx["email"], "password": ctx["password"]})
+        await call("GET", "/auth/me", headers=patient)
+        await call("PUT", "/auth/update", json={"address": "1 Check Street"}, headers=patient)
+        await call("GET", "/profile/", headers=patient)
+        await call("PUT", "/profile/", json={"contact_number": "5550100"}, headers=patient)
+        await call("POST", "/profile/avatar", json={"avatar_url": "avatar.png"}, headers=patient)
+
+        # Directory, catalog and search
+        for params in ({}, {"city": ctx["city"]}, {"specialty": ctx["specialty"]}, {"gender": "F"},
+                       {"min_rating": 4.5}, {"languages": "Hindi"}, {"city": ctx["city"], "gender": "M"},
+                       {"cursor": doctor_id}):
+            await call("GET", "/doctors/", params=params)
+        await call("GET", f"/doctors/{doctor_id}")
+        await call("GET", "/products/", params={"category": ctx["category"]})
+        await call("GET", f"/products/{product_id}")
+        await call("GET", "/search/", params={"q": "tooth"})
+
+        # Appointments
+        await call("PUT", f"/appointments/working-hours/{doctor_id}", headers=admin,
+                   json=[{"weekday": day, "start": "09:00", "end": "17:00"} for day in range(7)])
+        response = await call("GET", f"/appointments/availability/{doctor_id}",
+                              params={"start": tomorrow.isoformat(), "end": (tomorrow + timedelta(days=6)).isoformat()})
+        slots = response.json().get("slots") if response.status_code == 200 else []
+        if slots:
+            await call("POST", "/appointments/", json={"doctor_id": doctor_id, "appointment_time": slots[0]}, headers=patient)
+        response = await call("GET", "/appointments/", headers=patient)
+        appointment_ids = [a["id"] for a in response.json().get("appointments", [])] if response.status_code == 200 else []
+        if appointment_ids:
+            await call("PUT", f"/appointments/{appointment_ids[-1]}/status", json={"status": "confirmed"}, headers=admin)
+            await call("PUT", "/appointments/bulk/status", json={"ids": appointment_ids[-1:], "status": "cancelled"},
+                       headers=admin)
+
+        # Orders
+        order = {"items": [{"product_id": product_id, "quantity": 2}]}
+        order_headers = {**patient, "Idempotency-Key": uuid.uuid4().hex}
+        response = await call("POST", "/orders/", json=order, headers=order_headers)
+        await call("POST", "/orders/", json=order, headers=order_headers)  # idempotent replay
+        order_id = response.json().get("order_id") if response.status_code == 200 else None
+        response = await call("GET", "/orders/", params={"limit": 2}, headers=patient)
+        next_cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+        if next_cursor:
+            await call("GET", "/orders/", params={"limit": 2, "cursor": next_cursor}, headers=patient)
+        await call("GET", "/orders/", params={"status": "pending"}, headers=patient)
+        if order_id:
+            await call("GET", f"/orders/{order_id}", headers=patient)
+            await call("PUT", f"/orders/{order_id}/status", json={"status": "confirmed"}, headers=admin)
+            await call("PUT", "/orders/bulk/status", json={"ids": [order_id], "status": "cancelled"}, headers=admin)
+
+        # Scans
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), (200, 120, 90)).save(buffer, "JPEG")
+        await call("POST", "/scans/", params={"mode": "sync"}, headers=patient,
+                   files=[("files", ("scan.jpg", buffer.getvalue(), "image/jpeg"))])
+        response = await call("GET", "/scans/", headers=patient)
+        scans = response.json().get("scans", []) if response.status_code == 200 else []
+        if scans:
+            await call("GET", f"/scans/{scans[0]['id']}", headers=patient)
+            await call("GET", "/scans/", params={"cursor": scans[0]["id"]}, headers=patient)
+
+        # Analytics
+        for path in ("/analytics/revenue", "/analytics/orders/funnel", "/analytics/scans/severity"):
+            await call("GET", path, params={"bucket": "week"}, headers=admin)
+        await call("GET", "/analytics/appointments", params={"doctor_id": doctor_id}, headers=admin)
+
+        # Admin catalog writes last: they change what the reads above see
+        product = {"name": "Plan Check Brush", "description": "check", "image_url": "check.png",
+                   "price": "9.99", "category": ctx["category"]}
+        await call("POST", "/products/", json=product, headers=admin)
+        await call("PUT", f"/products/{product_id}", json=product, headers=admin)
+        doctor = {"first_name": "Plan", "last_name": "Check", "city": ctx["city"], "specialty": ctx["specialty"]}
+        await call("POST", "/doctors/", json=doctor, headers=admin)
+        await call("PUT", f"/doctors/{doctor_id}", json=doctor, headers=admin)
+        if ctx["spare_product_id"]:
+            await call("DELETE", f"/products/{ctx['spare_product_id']}", headers=admin)
+        if ctx["spare_doctor_id"]:
+            await call("DELETE", f"/doctors/{ctx['spare_doctor_id']}", headers=admin)
+    return failures
+
+
+def load_context():
+    from db import get_connection
+    from auth import create_access_token
+    from benchmarks.seed import BENCH_PASSWORD
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT email FROM users WHERE email LIKE '%@bench.local' ORDER BY id LIMIT 1")
+    email = cursor.fetchone()["email"]
+    cursor.execute("SELECT id, city, specialty FROM doctors ORDER BY id")
+    doctors = cursor.fetchall()
+    cursor.execute("SELECT id, category FROM products ORDER BY id")
+    products = cursor.fetchall()
+    # Rows nothing references, so the admin deletes pass the foreign keys
+    cursor.execute("SELECT MAX(id) AS id FROM doctors WHERE id NOT IN (SELECT doctor_id FROM appointments)")
+    spare_doctor_id = cursor.fetchone()["id"]
+    cursor.execute("SELECT MAX(id) AS id FROM products WHERE id NOT IN (SELECT product_id FROM order_items)")
+    spare_product_id = cursor.fetchone()["id"]
+    cursor.close()
+    conn.close()
+    return {
+        "email": email,
+        "password": BENCH_PASSWORD,
+        "patient_headers": {"Authorization": "Bearer " + create_access_token({"sub": email}, "patient")},
+        "admin_headers": {"Authorization": "Bearer " + create_access_token({"sub": "admin@check.local"}, "admin")},
+        "doctor_id": doctors[0]["id"],
+        "city": doctors[0]["city"],
+        "specialty": doctors[0]["specialty"],
+        "spare_doctor_id": spare_doctor_id,
+        "product_id": products[0]["id"],
+        "category": products[0]["category"],
+        "spare_product_id": spare_product_id,
+    }
+
+
+async def run(args):
+    import main
+    from db import DB_BACKEND, capture_queries, get_connection
+
+    if not args.use_env_db:
+        from benchmarks.seed import seed
+        seed(os.environ["DB_NAME"], args.scale, args.seed)
+    ctx = load_context()
+
+    async with main.app.router.lifespan_context(main.app):
+        with capture_queries() as captured:
+            failures = await exercise(main.app, ctx)
+
+    statements = {}
+    for query, params in captured:
+        statements.setdefault(normalise(query), params)
+
+    unexpected, allowed = [], []
+    conn = get_connection()
+    try:
+        for query, params in statements.items():
+            if not query.upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+                continue
+            full, plan = explain(conn, DB_BACKEND, query, params)
+            if args.verbose:
+                print(f"\n{query}\n  " + "\n  ".join(plan))
+            if full:
+                reason = allowed_reason(query)
+                (allowed if reason else unexpected).append((query, full, plan, reason))
+    finally:
+        conn.close()
+    return len(statements), failures, allowed, unexpected
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.check_query_plans")
+    parser.add_argument("--scale", type=float, default=1.0, help="seed data multiplier (see benchmarks/seed.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--use-env-db", action="store_true",
+                        help="check the database configured by DB_BACKEND/DB_* instead of seeding SQLite")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.use_env_db:
+            os.environ.update(DB_BACKEND="sqlite", DB_NAME=os.path.join(workdir, "plans.sqlite3"))
+        os.environ.update(AI_BACKEND="fake", AI_FAKE_LATENCY="0", REPORTS_DIR=os.path.join(workdir, "reports"),
+                          DIAGNOSIS_CACHE_DIR="", SLOW_REQUEST_MS="0", REPORT_RENDERER="native")
+        os.environ.setdefault("SECRET_KEY", "plan-check-secret")
+        total, failures, allowed, unexpected = asyncio.run(run(args))
+
+    for failure in failures:
+        print(f"[WARN] {failure}")
+    print(f"Explained {total} distinct statements: {len(allowed)} allowed full scan(s), {len(unexpected)} unexpected")
+    for query, tables, _, reason in allowed:
+        print(f"  allowed  {', '.join(tables)}: {reason}")
+    for query, tables, plan, _ in unexpected:
+        print(f"\n[FAIL] full scan of {', '.join(tables)}:\n  {query}\n  plan: " + "\n        ".join(plan))
+    sys.exit(1 if unexpected or failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,142 @@
+# Builds a local SQLite database from the migrations + sample_data.sql and fills it with synthetic
+# users, doctors, products, orders and appointments, scaled by --scale and reproducible by --seed.
+# Usage: python -m benchmarks.seed bench.sqlite3 --scale 2
+import os
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLE_DATA_PATH = os.path.join(ROOT, "sample_data.sql")
+
+BENCH_PASSWORD = "bench-password"
+# Rows per unit of --scale
+BASE_COUNTS = {"users": 500, "doctors": 100, "products": 1000, "orders": 2000, "appointments": 1000}
+
+CITIES = ("Mumbai", "Delhi", "Bengaluru", "Chennai", "Pune", "Hyderabad", "Kolkata", "Jaipur")
+SPECIALTIES = ("General Dentistry", "Pediatric Dentistry", "Orthodontics", "Periodontics", "Endodontics", "Oral Surgery")
+LANGUAGES = ("English", "English,Hindi", "Hindi", "English,Marathi", "English,Tamil")
+CATEGORIES = ("Oral Care", "Whitening", "Floss", "Mouthwash", "Kids", "Orthodontic Care")
+PRODUCT_WORDS = ("Electric", "Bamboo", "Charcoal", "Sensitive", "Fluoride", "Herbal", "Travel", "Premium", "Mint", "Ultra")
+PRODUCT_KINDS = ("Toothbrush", "Toothpaste", "Floss Picks", "Mouthwash", "Whitening Strips", "Tongue Cleaner", "Water Flosser")
+FIRST_NAMES = ("Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sara", "Kabir", "Meera", "Arjun", "Isha", "John", "Sarah")
+LAST_NAMES = ("Sharma", "Patel", "Iyer", "Khan", "Reddy", "Das", "Singh", "Lee", "Doe", "Mehta")
+
+
+def create_schema(path):
+    # The same migrations production runs, so benchmarks see the real indexes
+    from db import SQLiteConnection
+    from utils.migrate import migrate
+    conn = SQLiteConnection(path)
+    try:
+        migrate(conn, backend="sqlite", log=lambda message: None)
+    finally:
+        conn.close()
+
+
+def _timestamp(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def seed(path, scale=1.0, seed=1, password_hash=None):
+    """Create a fresh database at path and return the number of rows generated per table."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    counts = {table: max(1, int(n * scale)) for table, n in BASE_COUNTS.items()}
+    if password_hash is None:
+        from auth import hash_password
+        password_hash = hash_password(BENCH_PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+
+    create_schema(path)
+    conn = sqlite3.connect(path)
+    with open(SAMPLE_DATA_PATH) as f:
+        conn.executescript(f.read())
+
+    conn.executemany("""
+        INSERT INTO users (email, password_hash, first_name, last_name, gender, date_of_birth, role)
+        VALUES (?, ?, ?, ?, ?, ?, 'patient')
+    """, [
+        (f"user{i}@bench.local", password_hash, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice("MF"),
+         f"{rng.randint(1950, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        for i in range(counts["users"])
+    ])
+    conn.executemany("""
+        INSERT INTO doctors (first_name, last_name, short_bio, gender, specialty, languages, rating, profile_image, city)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"{rng.randint(2, 30)} years of clinical practice",
+         rng.choice("MF"), rng.choice(SPECIALTIES), rng.choice(LANGUAGES), round(rng.uniform(3.0, 5.0), 1),
+         f"doctor{i}.png", rng.choice(CITIES))
+        for i in range(counts["doctors"])
+    ])
+    conn.executemany("""
+        INSERT INTO products (name, description, image_url, price, category) VALUES (?, ?, ?, ?, ?)
+    """, [
+        (f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_KINDS)} {i}",
+         f"{rng.choice(PRODUCT_WORDS)} formula for everyday {rng.choice(CATEGORIES).lower()}",
+         f"product{i}.png", f"{rng.uniform(49, 4999):.2f}", rng.choice(CATEGORIES))
+        for i in range(counts["products"])
+    ])
+
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users")]
+    doctor_ids = [row[0] for row in conn.execute("SELECT id FROM doctors")]
+    prices = dict(conn.execute("SELECT id, price FROM products"))
+    product_ids = list(prices)
+
+    items = []
+    for order_id in range(1, counts["orders"] + 1):
+        chosen = rng.sample(product_ids, rng.randint(1, min(4, len(product_ids))))
+        lines = [(order_id, product_id, rng.randint(1, 3), prices[product_id]) for product_id in chosen]
+        items.extend(lines)
+    totals = {}
+    for order_id, _, quantity, price in items:
+        totals[order_id] = totals.get(order_id, 0) + quantity * float(price)
+    conn.executemany("""
+        INSERT INTO orders (id, user_id, total_price, status, created_at) VALUES (?, ?, ?, ?, ?)
+    """, [
+        (order_id, rng.choice(user_ids), f"{totals[order_id]:.2f}",
+         rng.choice(("pending", "paid", "shipped", "delivered", "cancelled")),
+         _timestamp(now - timedelta(minutes=rng.randint(1, 90 * 24 * 60))))
+        for order_id in range(1, counts["orders"] + 1)
+    ])
+    conn.executemany("INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)", items)
+
+    # Past appointments on the half hour, one active booking per doctor and slot
+    taken = set()
+    appointments = []
+    while len(appointments) < counts["appointments"]:
+        doctor_id = rng.choice(doctor_ids)
+        when = (now - timedelta(days=rng.randint(1, 180))).replace(hour=rng.randint(9, 16), minute=rng.choice((0, 30)), second=0)
+        if (doctor_id, when) in taken:
+            continue
+        taken.add((doctor_id, when))
+        status = rng.choice(("completed", "completed", "cancelled", "confirmed"))
+        appointments.append((rng.choice(user_ids), doctor_id, _timestamp(when), status,
+                             None if status == "cancelled" else _timestamp(when)))
+    conn.executemany("""
+        INSERT INTO appointments (user_id, doctor_id, appointment_time, status, active_slot) VALUES (?, ?, ?, ?, ?)
+    """, appointments)
+    conn.commit()
+    conn.close()
+
+    # Rollups are derived data: rebuild them the same way production does
+    from db import SQLiteConnection
+    from utils.analytics import backfill
+    conn = SQLiteConnection(path)
+    try:
+        backfill(conn)
+    finally:
+        conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.seed")
+    parser.add_argument("path")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(f"Seeded {args.path}: {seed(args.path, args.scale, args.seed)} (password: {BENCH_PASSWORD!r})")
@@ -1,13 +1,514 @@
 import os
+import re
+import time
+import queue
+import sqlite3
+import asyncio
+import weakref
+import threading
+from decimal import Decimal
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from fastapi import HTTPException
 import mysql.connector
+from utils.metrics import span, run_in_context
 
 load_dotenv()
 
-def get_connection():
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")  # "mysql" or "sqlite" (local stand-in)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "executor")  # "executor" or "aiomysql"
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_SIZE)))  # threads running driver calls
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Raised on unique/foreign key violations by either backend
+IntegrityError = (mysql.connector.errors.IntegrityError, sqlite3.IntegrityError)
+try:
+    import pymysql  # installed with aiomysql (DB_ASYNC_DRIVER=aiomysql)
+    IntegrityError += (pymysql.err.IntegrityError,)
+except ImportError:
+    pass
+
+
+def _connect_mysql():
     return mysql.connector.connect(
         host=os.getenv("DB_HOST"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         database=os.getenv("DB_NAME")
     )
+
+
+# ---------- SQLite stand-in ----------
+# Accepts the same %s placeholders and cursor(dictionary=True) calls the routers use,
+# so the app can run against a local file without a MySQL server.
+
+_PLACEHOLDER = re.compile(r"%s")
+# SQLite has no row locks; transactions take the write lock up front instead (BEGIN IMMEDIATE)
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.IGNORECASE)
+sqlite3.register_adapter(Decimal, str)
+
+
+class SQLiteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def execute(self, query, params=()):
+        query = _FOR_UPDATE.sub("", _PLACEHOLDER.sub("?", query))
+        self._cursor.execute(query, tuple(params or ()))
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(_PLACEHOLDER.sub("?", query), [tuple(p) for p in seq_params])
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.create_function("CONCAT", -1, lambda *parts: "".join("" if p is None else str(p) for p in parts))
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def start_transaction(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+
+def _connect_sqlite():
+    return SQLiteConnection(os.getenv("DB_NAME", "intellident.sqlite3"))
+
+
+# ---------- Connection pool ----------
+
+# (query, params) of every statement run while capture_queries() is active; the query plan
+# check (benchmarks/check_query_plans.py) EXPLAINs them afterwards
+_captured_queries = None
+
+
+@contextmanager
+def capture_queries():
+    global _captured_queries
+    _captured_queries = captured = []
+    try:
+        yield captured
+    finally:
+        _captured_queries = None
+
+
+def _capture(query, params):
+    if _captured_queries is not None:
+        _captured_queries.append((query, tuple(params or ())))
+
+
+class TimedCursor:
+    """Cursor proxy recording each statement as a db.query span."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, query, params=()):
+        _capture(query, params)
+        with span("db.query"):
+            return self._cursor.execute(query, params)
+
+    def executemany(self, query, seq_params):
+        if seq_params:
+            _capture(query, seq_params[0])
+        with span("db.query"):
+            return self._cursor.executemany(query, seq_params)
+
+
+class PooledConnection:
+    """Proxy handed out by the pool; close() returns the connection instead of closing it."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, ping_interval=DB_POOL_PING_INTERVAL):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.stats = {
+            "created": 0,
+            "acquired": 0,
+            "released": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "in_use": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    def _healthy(self, raw):
+        if time.monotonic() - self._last_used.get(id(raw), 0) < self.ping_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        self._last_used.pop(id(raw), None)
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+
+        try:
+            raw = None
+            while raw is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    raw = self._factory()
+                    with self._lock:
+                        self.stats["created"] += 1
+                    break
+                if self._healthy(candidate):
+                    raw = candidate
+                else:
+                    self._discard(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.stats["acquired"] += 1
+            self.stats["in_use"] += 1
+            self.stats["wait_seconds_total"] += time.monotonic() - started
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        try:
+            # Never hand an open transaction or unread result set to the next caller
+            raw.rollback()
+            self._last_used[id(raw)] = time.monotonic()
+            self._idle.put(raw)
+        except Exception:
+            self._discard(raw)
+        finally:
+            with self._lock:
+                self.stats["released"] += 1
+                self.stats["in_use"] -= 1
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+        data["size"] = self.size
+        data["idle"] = self._idle.qsize()
+        return data
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                factory = _connect_sqlite if DB_BACKEND == "sqlite" else _connect_mysql
+                _pool = ConnectionPool(factory)
+    return _pool
+
+
+def get_connection():
+    with span("db.connect"):
+        return get_pool().acquire()
+
+
+def get_pool_stats():
+    return get_pool().snapshot()
+
+
+@contextmanager
+def transaction(conn):
+    """Run the block atomically: commit on success, roll back on any error."""
+    if getattr(conn, "in_transaction", False):
+        # End the implicit snapshot left open by earlier SELECTs on this connection
+        conn.commit()
+    conn.start_transaction()
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+# ---------- Async mode ----------
+# "executor" runs the pooled sync driver on a dedicated thread pool so DB waits never
+# occupy Starlette's shared threadpool; "aiomysql" uses a native async driver. Either way
+# requests queue for a connection on the event loop, not in a thread.
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_aio_pool = None
+_async_slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore(DB_POOL_SIZE)
+
+
+class AsyncCursor:
+    def __init__(self, cursor, native=False):
+        self._cursor = cursor
+        self._native = native
+
+    async def _call(self, name, *args):
+        if self._native:
+            return await getattr(self._cursor, name)(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_db_executor, run_in_context(getattr(self._cursor, name)), *args)
+
+    async def execute(self, query, params=()):
+        if self._native:
+            _capture(query, params)
+            with span("db.query"):
+                return await self._call("execute", query, params)
+        return await self._call("execute", query, params)
+
+    async def executemany(self, query, seq_params):
+        if self._native:
+            if seq_params:
+                _capture(query, seq_params[0])
+            with span("db.query"):
+                return await self._call("executemany", query, seq_params)
+        return await self._call("executemany", query, seq_params)
+
+    async def fetchone(self):
+        return await self._call("fetchone")
+
+    async def fetchall(self):
+        return await self._call("fetchall")
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def close(self):
+        await self._call("close")
+
+
+def _begin(conn):
+    # End the implicit snapshot left open by earlier SELECTs, then start, in one executor hop
+    if getattr(conn, "in_transaction", False):
+        conn.commit()
+    conn.start_transaction()
+
+
+class AsyncConnection:
+    def __init__(self, conn, native=False):
+        self._conn = conn
+        self._native = native
+
+    async def _call(self, name, *args):
+        if self._native:
+            return await getattr(self._conn, name)(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_db_executor, run_in_context(getattr(self._conn, name)), *args)
+
+    async def cursor(self, dictionary=False):
+        if self._native:
+            import aiomysql
+            return AsyncCursor(await self._conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor), native=True)
+        # mysql-connector's cursor() checks the connection with a server round-trip, so it
+        # runs on the executor like every other driver call
+        loop = asyncio.get_running_loop()
+        cursor = await loop.run_in_executor(_db_executor, run_in_context(lambda: self._conn.cursor(dictionary=dictionary)))
+        return AsyncCursor(cursor)
+
+    async def start_transaction(self):
+        if self._native:
+            return await self._conn.begin()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_db_executor, run_in_context(_begin), self._conn)
+
+    async def commit(self):
+        return await self._call("commit")
+
+    async def rollback(self):
+        return await self._call("rollback")
+
+
+@asynccontextmanager
+async def async_transaction(conn):
+    """Async counterpart of transaction(): commit on success, roll back on any error."""
+    await conn.start_transaction()
+    try:
+        yield
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+
+
+async def _get_aio_pool():
+    global _aio_pool
+    if _aio_pool is None:
+        import aiomysql
+        _aio_pool = await aiomysql.create_pool(
+            host=os.getenv("DB_HOST"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            db=os.getenv("DB_NAME"),
+            maxsize=DB_POOL_SIZE,
+            pool_recycle=int(DB_POOL_PING_INTERVAL) * 10,
+        )
+    return _aio_pool
+
+
+def _slots():
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(DB_POOL_SIZE)
+    return slots
+
+
+@asynccontextmanager
+async def async_connection():
+    """Borrow a connection without blocking the event loop; raises PoolTimeout when none frees up."""
+    if DB_ASYNC_DRIVER == "aiomysql" and DB_BACKEND == "mysql":
+        pool = await _get_aio_pool()
+        try:
+            with span("db.connect"):
+                raw = await asyncio.wait_for(pool.acquire(), timeout=DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No database connection available within {DB_POOL_TIMEOUT}s")
+        try:
+            yield AsyncConnection(raw, native=True)
+        finally:
+            await raw.rollback()
+            pool.release(raw)
+        return
+
+    # Waiters queue on the loop, so a burst of requests costs no threads; a permit means the
+    # pool has (or will shortly have, if sync callers hold some) a connection to hand out
+    slots = _slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f"No database connection available within {DB_POOL_TIMEOUT}s")
+    loop = asyncio.get_running_loop()
+    try:
+        conn = await loop.run_in_executor(_db_executor, run_in_context(get_connection))
+        try:
+            yield AsyncConnection(conn)
+        finally:
+            await loop.run_in_executor(_db_executor, conn.close)
+    finally:
+        slots.release()
+
+
+async def get_async_db():
+    """FastAPI dependency: borrow a pooled connection for the duration of the request."""
+    try:
+        async with async_connection() as conn:
+            yield conn
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+
+async def close_pools():
+    global _aio_pool
+    if _pool is not None:
+        _pool.close()
+    if _aio_pool is not None:
+        _aio_pool.close()
+        await _aio_pool.wait_closed()
+        _aio_pool = None
@@ -1,21 +1,64 @@
 # main.py
-from fastapi import FastAPI
+import os
+import asyncio
+import anyio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from db import close_pools, PoolTimeout
+from auth import password_hasher
+from utils.jobs import scan_queue
+from utils.pdf_report import shutdown_converter
+from utils.storage import run_retention_sweeper, shutdown_io, check_storage_config, REPORT_RETENTION_DAYS
+from utils.metrics import MetricsMiddleware, METRICS_ENABLED
+from utils.images import UploadLimitMiddleware, SCAN_MAX_UPLOAD_BYTES
+from utils.serialization import FastJSONResponse
 from routers.auth_routes import router as auth_router
 from routers.doctors_routes import router as doctor_router
 from routers.appointments_routes import router as appointment_router
 from routers.products_routes import router as products_router
 from routers.orders_routes import router as orders_router
 from routers.profile_routes import router as profile_router
-from routers.scan_routes import router as scan_router
-from fastapi.staticfiles import StaticFiles
+from routers.scan_routes import router as scan_router, MAX_SCAN_IMAGES
+from routers.reports_routes import router as reports_router
+from routers.search_routes import router as search_router
+from routers.analytics_routes import router as analytics_router
+from routers.metrics_routes import router as metrics_router
+
+# Every route and dependency in this app is async; Starlette's threadpool (default 40) is left
+# serving UploadFile reads and sync dependency classes such as OAuth2PasswordRequestForm
+THREADPOOL_WORKERS = int(os.getenv("THREADPOOL_WORKERS", "0"))
+
+# JSON bodies at least this large are gzipped for clients that accept it (0 disables); small ones
+# aren't worth the CPU. PDFs are already compressed, and a streamed report must keep its byte ranges.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_storage_config()
+    if THREADPOOL_WORKERS:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_WORKERS
+    sweeper = asyncio.create_task(run_retention_sweeper()) if REPORT_RETENTION_DAYS else None
+    yield
+    if sweeper:
+        sweeper.cancel()
+    await scan_queue.shutdown()
+    shutdown_converter()
+    password_hasher.shutdown()
+    shutdown_io()
+    await close_pools()
 
 app = FastAPI(
     title="IntelliDent AI API",
     description="FastAPI backend for IntelliDent AI App",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-app.mount("/reports", StaticFiles(directory="reports"), name="reports")
+# Handlers that borrow a connection outside get_async_db (caches, scans) report exhaustion the same way
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return FastJSONResponse(status_code=503, content={"detail": "Database busy, please retry"})
 
 # Register routers
 app.include_router(auth_router)
@@ -25,8 +68,18 @@ app.include_router(products_router)
 app.include_router(orders_router)
 app.include_router(profile_router)
 app.include_router(scan_router)
+app.include_router(reports_router)
+app.include_router(search_router)
+app.include_router(analytics_router)
+app.include_router(metrics_router)
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+
+# Bounds scan uploads while they stream in: every file at its limit plus 1 MB of multipart framing.
+# Added before CORS so CORS wraps it and its 413 still carries the Access-Control headers.
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_SCAN_IMAGES * SCAN_MAX_UPLOAD_BYTES + 1024 * 1024)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,5 +87,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers browser clients need to read (the doctor page cursor, order replays)
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
+if GZIP_MIN_SIZE:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL,
+                       exclude_content_types=(*DEFAULT_EXCLUDED_CONTENT_TYPES, "application/pdf"))
+
+# Added last so it wraps everything else, CORS included
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,4 @@
+-- Read by login (role) and the profile endpoints (address, contact_number)
+ALTER TABLE users ADD COLUMN role VARCHAR(20) NOT NULL DEFAULT 'patient';
+ALTER TABLE users ADD COLUMN address VARCHAR(255);
+ALTER TABLE users ADD COLUMN contact_number VARCHAR(20);
@@ -0,0 +1,5 @@
+-- Directory filters; each ends in id so the keyset (ORDER BY id) pages stay index-only
+CREATE INDEX idx_doctors_city ON doctors (city, id);
+CREATE INDEX idx_doctors_specialty ON doctors (specialty, id);
+CREATE INDEX idx_doctors_gender ON doctors (gender, id);
+CREATE INDEX idx_doctors_rating ON doctors (rating, id);
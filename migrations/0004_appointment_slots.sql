@@ -0,0 +1,27 @@
+-- Copy of appointment_time while the booking holds its slot, NULL once cancelled;
+-- the unique key makes a second concurrent booking of the same slot fail
+ALTER TABLE appointments ADD COLUMN active_slot DATETIME;
+UPDATE appointments SET active_slot = appointment_time WHERE status <> 'cancelled' AND active_slot IS NULL;
+-- Older schemas allowed double bookings, which the unique key below would reject (errno 1062):
+-- the oldest booking per doctor and time keeps the slot, later ones stay as they are but hold none.
+-- Find them afterwards with: SELECT * FROM appointments WHERE status <> 'cancelled' AND active_slot IS NULL
+UPDATE appointments SET active_slot = NULL
+WHERE active_slot IS NOT NULL AND id NOT IN (
+    SELECT keep_id FROM (
+        SELECT MIN(id) AS keep_id FROM appointments WHERE active_slot IS NOT NULL GROUP BY doctor_id, active_slot
+    ) AS keepers
+);
+CREATE UNIQUE INDEX uq_appointments_doctor_slot ON appointments (doctor_id, active_slot);
+
+-- Weekly schedule per doctor (weekday 0 = Monday, minutes since midnight); doctors without
+-- rows fall back to APPOINTMENT_DEFAULT_HOURS / APPOINTMENT_DEFAULT_DAYS
+CREATE TABLE doctor_working_hours (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    doctor_id INT NOT NULL,
+    weekday TINYINT NOT NULL,
+    start_minute SMALLINT NOT NULL,
+    end_minute SMALLINT NOT NULL,
+    slot_minutes SMALLINT NOT NULL DEFAULT 30,
+    UNIQUE KEY uq_working_hours (doctor_id, weekday, start_minute),
+    FOREIGN KEY (doctor_id) REFERENCES doctors(id) ON DELETE CASCADE
+);
@@ -0,0 +1,18 @@
+-- mysql-only: SQLite stores ENUM columns as TEXT
+ALTER TABLE orders MODIFY status ENUM('pending', 'paid', 'confirmed', 'shipped', 'delivered', 'cancelled');
+
+-- Order history: WHERE user_id = ? ORDER BY created_at DESC, id DESC (InnoDB appends id to the index)
+CREATE INDEX idx_orders_user_created ON orders (user_id, created_at);
+
+-- Lets a retried POST /orders/ (same Idempotency-Key header) return the original order
+CREATE TABLE order_idempotency_keys (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    order_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_order_idempotency (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+);
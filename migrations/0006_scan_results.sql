@@ -0,0 +1,6 @@
+ALTER TABLE scans ADD COLUMN severity TINYINT;
+ALTER TABLE scans ADD COLUMN image_refs TEXT;
+ALTER TABLE scans ADD COLUMN report_key VARCHAR(255);
+
+-- Scan history: WHERE user_id = ? ORDER BY id DESC
+CREATE INDEX idx_scans_user ON scans (user_id, id);
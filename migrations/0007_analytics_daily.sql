@@ -0,0 +1,9 @@
+-- Daily rollups for /analytics; fill them for existing rows with: python -m utils.analytics backfill
+CREATE TABLE analytics_daily (
+    bucket_date DATE NOT NULL,
+    metric VARCHAR(40) NOT NULL,
+    dimension VARCHAR(40) NOT NULL DEFAULT '',
+    event_count INT NOT NULL DEFAULT 0,
+    amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_date, metric, dimension)
+);
@@ -0,0 +1,8 @@
+-- Appointment list: WHERE user_id = ? ORDER BY appointment_time
+CREATE INDEX idx_appointments_user_time ON appointments (user_id, appointment_time);
+
+-- order_items foreign keys: line items for a page of orders (WHERE order_id IN (...)) and the
+-- reference check when a product is deleted. MySQL indexes foreign keys on its own under
+-- generated names and drops those once these exist; SQLite has no index without them.
+CREATE INDEX idx_order_items_order ON order_items (order_id);
+CREATE INDEX idx_order_items_product ON order_items (product_id);
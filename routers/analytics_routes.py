@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+from typing import Literal, Optional
+from collections import defaultdict
+from fastapi import APIRouter, HTTPException, Depends
+from db import get_async_db
+from utils.roles import require_admin
+from utils.analytics import series
+from utils.status import ORDER_TRANSITIONS
+from schemas import RevenueSeries, FunnelSeries, AppointmentSeries, SeveritySeries
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+ANALYTICS_MAX_DAYS = 366
+ORDER_FUNNEL = tuple(ORDER_TRANSITIONS)
+
+
+def date_range(start, end):
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if end < start or (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {ANALYTICS_MAX_DAYS} days")
+    return start, end
+
+
+def by_period(totals):
+    periods = defaultdict(dict)
+    for (period, metric, dimension), values in totals.items():
+        periods[period][(metric, dimension)] = values
+    return sorted(periods.items())
+
+
+@router.get("/revenue", response_model=RevenueSeries)
+async def revenue(
+    bucket: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    admin: dict = Depends(require_admin),
+    conn=Depends(get_async_db),
+):
+    start, end = date_range(start, end)
+    totals = await series(conn, ("orders", "order_status"), start, end, bucket)
+    result = []
+    for period, values in by_period(totals):
+        orders, gross = values.get(("orders", ""), (0, 0))
+        cancelled = values.get(("order_status", "cancelled"), (0, 0))[1]
+        result.append({"period": period, "orders": orders, "gross": gross, "cancelled": cancelled, "net": gross - cancelled})
+    return {"bucket": bucket, "start": start, "end": end, "series": result}
+
+
+@router.get("/orders/funnel", response_model=FunnelSeries)
+async def order_funnel(
+    bucket: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    admin: dict = Depends(require_admin),
+    conn=Depends(get_async_db),
+):
+    # Counts of orders entering each status; "pending" is every order placed
+    start, end = date_range(start, end)
+    totals = await series(conn, ("order_status",), start, end, bucket)
+    result = [
+        {"period": period, **{status: values.get(("order_status", status), (0, 0))[0] for status in ORDER_FUNNEL}}
+        for period, values in by_period(totals)
+    ]
+    return {"bucket": bucket, "start": start, "end": end, "series": result}
+
+
+@router.get("/appointments", response_model=AppointmentSeries)
+async def appointments_per_doctor(
+    bucket: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    doctor_id: Optional[int] = None,
+    admin: dict = Depends(require_admin),
+    conn=Depends(get_async_db),
+):
+    # Bucketed by appointment date; booked counts every booking, including ones later cancelled
+    start, end = date_range(start, end)
+    metrics = {"appointments": "booked", "appointments_completed": "completed", "appointments_cancelled": "cancelled"}
+    totals = await series(conn, tuple(metrics), start, end, bucket, doctor_id)
+    result = []
+    for period, values in by_period(totals):
+        doctors = defaultdict(lambda: {"booked": 0, "completed": 0, "cancelled": 0})
+        for (metric, dimension), (count, _) in values.items():
+            doctors[int(dimension)][metrics[metric]] += count
+        result.append({"period": period, "doctors": [{"doctor_id": d, **counts} for d, counts in sorted(doctors.items())]})
+    return {"bucket": bucket, "start": start, "end": end, "series": result}
+
+
+@router.get("/scans/severity", response_model=SeveritySeries)
+async def scan_severity(
+    bucket: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    admin: dict = Depends(require_admin),
+    conn=Depends(get_async_db),
+):
+    start, end = date_range(start, end)
+    totals = await series(conn, ("scans",), start, end, bucket)
+    result = [
+        {"period": period, **{band: values.get(("scans", band), (0, 0))[0] for band in ("mild", "moderate", "severe", "unknown")}}
+        for period, values in by_period(totals)
+    ]
+    return {"bucket": bucket, "start": start, "end": end, "series": result}
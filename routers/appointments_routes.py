@@ -1,100 +1,195 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from db import get_connection
-from utils.token import oauth2_scheme
-from jose import jwt, JWTError
-from auth import SECRET_KEY, ALGORITHM
-from datetime import datetime
-from schemas import StatusUpdate
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel, Field
+from db import get_async_db, async_transaction, IntegrityError
+from utils.token import get_current_user
+from utils.slots import (WorkingWindow, default_windows, window_for, open_slots, overlaps, parse_hhmm, to_datetime,
+                         AVAILABILITY_MAX_DAYS)
+from datetime import datetime, date, timedelta
+from schemas import StatusUpdate, BulkStatusUpdate, MessageOut, AvailabilityOut, AppointmentList, BulkStatusOut
 from utils.roles import require_admin
+from utils.status import APPOINTMENT_TRANSITIONS, bulk_transition
+from utils.analytics import record_appointment, record_appointment_status
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 
+# Outcomes counted per doctor in analytics_daily
+TRACKED_APPOINTMENT_STATUSES = ("completed", "cancelled")
+
 class AppointmentRequest(BaseModel):
     doctor_id: int
     appointment_time: datetime
 
-@router.post("/")
-def book_appointment(data: AppointmentRequest, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id FROM users WHERE email=%s", (email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        cursor.execute("SELECT id FROM doctors WHERE id=%s", (data.doctor_id,))
-        doctor = cursor.fetchone()
-        if not doctor:
-            raise HTTPException(status_code=404, detail="Doctor not found")
-
-        cursor.execute("""
-            INSERT INTO appointments (user_id, doctor_id, appointment_time, status)
-            VALUES (%s, %s, %s, 'pending')
-        """, (user["id"], data.doctor_id, data.appointment_time))
-        conn.commit()
+class WorkingHoursIn(BaseModel):
+    weekday: int = Field(..., ge=0, le=6)  # 0 = Monday
+    start: str = Field(..., pattern=r"^\d{2}:\d{2}$")
+    end: str = Field(..., pattern=r"^\d{2}:\d{2}$")
+    slot_minutes: int = Field(30, ge=5, le=240)
+
+
+async def load_schedule(conn, doctor_id, start=None, end=None):
+    """Doctor check, working hours and active bookings in one round trip."""
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute("""
+        SELECT 'doctor' AS kind, NULL AS weekday, NULL AS start_minute, NULL AS end_minute, NULL AS slot_minutes, NULL AS slot
+        FROM doctors WHERE id = %s
+        UNION ALL
+        SELECT 'hours', weekday, start_minute, end_minute, slot_minutes, NULL
+        FROM doctor_working_hours WHERE doctor_id = %s
+        UNION ALL
+        SELECT 'booked', NULL, NULL, NULL, NULL, active_slot
+        FROM appointments WHERE doctor_id = %s AND active_slot >= %s AND active_slot < %s
+    """, (doctor_id, doctor_id, doctor_id, start or datetime.min, end or datetime.min))
+    rows = await cursor.fetchall()
+    await cursor.close()
+
+    if not any(row["kind"] == "doctor" for row in rows):
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    windows = [WorkingWindow(r["weekday"], r["start_minute"], r["end_minute"], r["slot_minutes"])
+               for r in rows if r["kind"] == "hours"]
+    booked = [to_datetime(r["slot"]) for r in rows if r["kind"] == "booked"]
+    return windows or default_windows(), booked
+
+
+@router.get("/availability/{doctor_id}", response_model=AvailabilityOut)
+async def get_availability(
+    doctor_id: int,
+    start: date = Query(None, description="First day, defaults to today"),
+    end: date = Query(None, description="Last day (inclusive), defaults to start + 6 days"),
+    conn=Depends(get_async_db),
+):
+    start = start or date.today()
+    end = end or start + timedelta(days=6)
+    if end < start or (end - start).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {AVAILABILITY_MAX_DAYS} days")
+
+    # Include the day before so a late booking that overruns midnight still blocks its slot
+    range_start = datetime.combine(start, datetime.min.time()) - timedelta(days=1)
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    windows, booked = await load_schedule(conn, doctor_id, range_start, range_end)
+    slots = open_slots(windows, booked, start, end)
+    return {"doctor_id": doctor_id, "slots": [slot.isoformat(timespec="minutes") for slot in slots]}
+
+
+@router.put("/working-hours/{doctor_id}", response_model=MessageOut)
+async def set_working_hours(doctor_id: int, hours: list[WorkingHoursIn], admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    rows = []
+    for window in hours:
+        start_minute, end_minute = parse_hhmm(window.start), parse_hhmm(window.end)
+        if not 0 <= start_minute < end_minute <= 24 * 60:
+            raise HTTPException(status_code=400, detail=f"Invalid hours {window.start}-{window.end}")
+        rows.append((doctor_id, window.weekday, start_minute, end_minute, window.slot_minutes))
+
+    await load_schedule(conn, doctor_id)
+    async with async_transaction(conn):
+        cursor = await conn.cursor()
+        await cursor.execute("DELETE FROM doctor_working_hours WHERE doctor_id = %s", (doctor_id,))
+        if rows:
+            await cursor.executemany("""
+                INSERT INTO doctor_working_hours (doctor_id, weekday, start_minute, end_minute, slot_minutes)
+                VALUES (%s, %s, %s, %s, %s)
+            """, rows)
+        await cursor.close()
+    return {"message": "Working hours updated"}
+
+
+@router.post("/", response_model=MessageOut)
+async def book_appointment(data: AppointmentRequest, user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    when = data.appointment_time
+    if when.tzinfo:
+        when = when.astimezone().replace(tzinfo=None)
+    if when <= datetime.now():
+        raise HTTPException(status_code=400, detail="Appointment time must be in the future")
+
+    windows, _ = await load_schedule(conn, data.doctor_id)
+    window = window_for(windows, when)
+    if not window:
+        raise HTTPException(status_code=400, detail="Requested time is not an available slot")
+    length = timedelta(minutes=window.slot_minutes)
 
-        return {"message": "Appointment booked successfully"}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
-
-
-@router.get("/")
-def get_appointments(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id FROM users WHERE email=%s", (user_email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        cursor.execute("""
-            SELECT 
-                a.id, a.doctor_id, a.appointment_time, a.status,
-                CONCAT(d.first_name, ' ', d.last_name) AS doctor_name,
-                d.specialty
-            FROM appointments a
-            JOIN doctors d ON a.doctor_id = d.id
-            WHERE a.user_id = %s
-        """, (user["id"],))
-        appointments = cursor.fetchall()
-
-        return {"appointments": appointments}
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
-
-@router.put("/{appointment_id}/status")
-def update_appointment_status(appointment_id: int, status_update: StatusUpdate, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Optionally: validate status value
-    valid_statuses = ["pending", "confirmed", "completed", "cancelled"]
-    if status_update.status not in valid_statuses:
+        async with async_transaction(conn):
+            cursor = await conn.cursor()
+            # Same interval check as open_slots: after a slot length change, 09:00 can overlap a
+            # 09:30 booking without matching it exactly
+            await cursor.execute("""
+                SELECT active_slot FROM appointments
+                WHERE doctor_id = %s AND active_slot > %s AND active_slot < %s
+            """, (data.doctor_id, when - length, when + length))
+            booked = sorted(to_datetime(row[0]) for row in await cursor.fetchall())
+            if overlaps(booked, when, length):
+                await cursor.close()
+                raise HTTPException(status_code=409, detail="This slot overlaps an existing booking")
+            # uq_appointments_doctor_slot rejects the loser of two concurrent bookings
+            await cursor.execute("""
+                INSERT INTO appointments (user_id, doctor_id, appointment_time, status, active_slot)
+                VALUES (%s, %s, %s, 'pending', %s)
+            """, (user["id"], data.doctor_id, when, when))
+            await cursor.close()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="This slot has already been booked")
+    await record_appointment(conn, data.doctor_id, when)
+
+    return {"message": "Appointment booked successfully"}
+
+
+@router.get("/", response_model=AppointmentList)
+async def get_appointments(user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    cursor = await conn.cursor(dictionary=True)
+
+    await cursor.execute("""
+        SELECT 
+            a.id, a.doctor_id, a.appointment_time, a.status,
+            CONCAT(d.first_name, ' ', d.last_name) AS doctor_name,
+            d.specialty
+        FROM appointments a
+        JOIN doctors d ON a.doctor_id = d.id
+        WHERE a.user_id = %s
+        ORDER BY a.appointment_time
+    """, (user["id"],))
+    appointments = await cursor.fetchall()
+    await cursor.close()
+
+    return {"appointments": appointments}
+
+# Declared before /{appointment_id}/status so "bulk" isn't taken for an appointment id
+@router.put("/bulk/status", response_model=BulkStatusOut, response_model_exclude_none=True)
+async def bulk_update_appointment_status(update: BulkStatusUpdate, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    # Cancelling gives the slots back; every other status holds them (see update_appointment_status)
+    extra_set = ", active_slot = NULL" if update.status == "cancelled" else ", active_slot = appointment_time"
+    changed = []
+    try:
+        async with async_transaction(conn):
+            result = await bulk_transition(conn, "appointments", APPOINTMENT_TRANSITIONS, update.ids, update.status,
+                                           extra_set, columns=("doctor_id", "appointment_time"), on_updated=changed.extend)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="One of the slots has already been booked")
+    if update.status in TRACKED_APPOINTMENT_STATUSES:
+        await record_appointment_status(conn, update.status, changed)
+    return result
+
+@router.put("/{appointment_id}/status", response_model=MessageOut)
+async def update_appointment_status(appointment_id: int, status_update: StatusUpdate, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    if status_update.status not in APPOINTMENT_TRANSITIONS:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    cursor.execute("UPDATE appointments SET status = %s WHERE id = %s", (status_update.status, appointment_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        async with async_transaction(conn):
+            cursor = await conn.cursor(dictionary=True)
+            await cursor.execute("""
+                SELECT doctor_id, appointment_time, status FROM appointments WHERE id = %s FOR UPDATE
+            """, (appointment_id,))
+            appointment = await cursor.fetchone()
+            # A cancelled appointment gives its slot back; any other status takes it again, and
+            # uq_appointments_doctor_slot rejects that if the slot was rebooked in the meantime
+            await cursor.execute("""
+                UPDATE appointments
+                SET status = %s, active_slot = CASE WHEN %s = 'cancelled' THEN NULL ELSE appointment_time END
+                WHERE id = %s
+            """, (status_update.status, status_update.status, appointment_id))
+            await cursor.close()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="This slot has already been booked")
+    if appointment and appointment["status"] != status_update.status and status_update.status in TRACKED_APPOINTMENT_STATUSES:
+        await record_appointment_status(conn, status_update.status, [appointment])
 
     return {"message": f"Appointment status updated to '{status_update.status}'"}
@@ -1,124 +1,137 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from db import get_connection
-from auth import hash_password, verify_password, create_access_token, SECRET_KEY, ALGORITHM
-from schemas import RegisterSchema, UpdateUserProfile, UserAdmin, UserPatient
-from jose import jwt, JWTError
-from utils.token import oauth2_scheme
+from db import get_async_db
+from auth import create_access_token, password_hasher
+from schemas import RegisterSchema, UpdateUserProfile, UserAdmin, UserPatient, PROFILE_COLUMNS, MessageOut, TokenOut
+from utils.token import get_current_claims, invalidate_user
+from utils.rate_limit import login_ip_limiter, login_account_limiter, login_account_ip_limiter, register_ip_limiter, client_ip
 from datetime import datetime
 import json
+import math
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-@router.post("/register")
-def register(user: RegisterSchema):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email=%s", (user.email,))
-    if cursor.fetchone():
+def _check_rate(limiter, key, detail):
+    retry_after = limiter.acquire(key)
+    if retry_after:
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+# bcrypt runs on password_hasher's own pool, so a burst of logins can't starve the DB executor.
+@router.post("/register", response_model=MessageOut)
+async def register(request: Request, user: RegisterSchema, conn=Depends(get_async_db)):
+    _check_rate(register_ip_limiter, client_ip(request), "Too many attempts, try again later")
+    cursor = await conn.cursor()
+    await cursor.execute("SELECT id FROM users WHERE email=%s", (user.email,))
+    if await cursor.fetchone():
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    hashed_pw = hash_password(user.password)
-    cursor.execute("""
+    hashed_pw = await password_hasher.hash(user.password)
+    await cursor.execute("""
         INSERT INTO users (email, password_hash, first_name, last_name)
         VALUES (%s, %s, %s, %s)
     """, (user.email, hashed_pw, user.first_name, user.last_name))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    await conn.commit()
+    await cursor.close()
     return {"message": "User registered successfully"}
 
 
-@router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE email=%s", (form_data.username,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+@router.post("/token", response_model=TokenOut)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), conn=Depends(get_async_db)):
+    # Throttle before touching the database or bcrypt so a flood can't buy CPU time
+    ip = client_ip(request)
+    account = form_data.username.lower()
+    _check_rate(login_ip_limiter, ip, "Too many login attempts, try again later")
+    _check_rate(login_account_ip_limiter, (account, ip), "Too many login attempts for this account, try again later")
+    _check_rate(login_account_limiter, account, "Too many login attempts for this account, try again later")
+
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute("SELECT email, password_hash, role FROM users WHERE email=%s", (form_data.username,))
+    user = await cursor.fetchone()
 
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    if not user:
+        await cursor.close()
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    valid, new_hash = await password_hasher.verify(form_data.password, user["password_hash"])
+    if not valid:
+        await cursor.close()
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    if new_hash:
+        # Stored with a different BCRYPT_ROUNDS (or scheme); upgrade it now that we have the plaintext
+        await cursor.execute("UPDATE users SET password_hash=%s WHERE email=%s", (new_hash, user["email"]))
+        await conn.commit()
+    await cursor.close()
+    login_account_limiter.reset(account)
+    login_account_ip_limiter.reset((account, ip))
+
     token = create_access_token(data={"sub": user["email"]}, role=user["role"])
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserAdmin | UserPatient)
-def get_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        role = payload.get("role")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        if role == "admin":
-            return UserAdmin(**user)
-
-        # Load JSON fields for normal users
-        for key in ["symptoms", "previous_treatments"]:
-            if user.get(key):
-                try:
-                    user[key] = json.loads(user[key])
-                except:
-                    user[key] = []
-
-        return UserPatient(**user)
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-@router.put("/update")
-def update_user(data: UpdateUserProfile, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-
-        fields, values = [], []
-
-        for field, value in data.dict(exclude_unset=True).items():
-            if field in ["symptoms", "previous_treatments"]:
-                fields.append(f"{field} = %s")
-                values.append(json.dumps(value))
-            elif field == "brushing_frequency":
-                if value not in ['Once daily', 'Twice daily', 'Occasionally', 'Rarely']:
-                    continue
-                fields.append(f"{field} = %s")
-                values.append(value)
-            elif field in ["address", "contact_number"]:
-                fields.append(f"{field} = %s")
-                values.append(value)
-            elif isinstance(value, datetime):
-                fields.append(f"{field} = %s")
-                values.append(value.strftime('%Y-%m-%d %H:%M:%S'))
-            else:
-                fields.append(f"{field} = %s")
-                values.append(value)
-
-        if not fields:
-            raise HTTPException(status_code=400, detail="No fields provided")
-
-        values.append(email)
-        set_clause = ", ".join(fields)
-
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"UPDATE users SET {set_clause} WHERE email = %s", tuple(values))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        return {"message": "User profile updated successfully"}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+async def get_user(claims: dict = Depends(get_current_claims), conn=Depends(get_async_db)):
+    email = claims.get("sub")
+    role = claims.get("role")
+
+    cursor = await conn.cursor(dictionary=True)
+    columns = PROFILE_COLUMNS["admin" if role == "admin" else "patient"]
+    await cursor.execute(f"SELECT {columns} FROM users WHERE email = %s", (email,))
+    user = await cursor.fetchone()
+    await cursor.close()
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if role == "admin":
+        return UserAdmin(**user)
+
+    # Load JSON fields for normal users
+    for key in ["symptoms", "previous_treatments"]:
+        if user.get(key):
+            try:
+                user[key] = json.loads(user[key])
+            except:
+                user[key] = []
+
+    return UserPatient(**user)
+
+@router.put("/update", response_model=MessageOut)
+async def update_user(data: UpdateUserProfile, claims: dict = Depends(get_current_claims), conn=Depends(get_async_db)):
+    email = claims.get("sub")
+
+    fields, values = [], []
+
+    for field, value in data.dict(exclude_unset=True).items():
+        if field in ["symptoms", "previous_treatments"]:
+            fields.append(f"{field} = %s")
+            values.append(json.dumps(value))
+        elif field == "brushing_frequency":
+            if value not in ['Once daily', 'Twice daily', 'Occasionally', 'Rarely']:
+                continue
+            fields.append(f"{field} = %s")
+            values.append(value)
+        elif field in ["address", "contact_number"]:
+            fields.append(f"{field} = %s")
+            values.append(value)
+        elif isinstance(value, datetime):
+            fields.append(f"{field} = %s")
+            values.append(value.strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            fields.append(f"{field} = %s")
+            values.append(value)
+
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields provided")
+
+    values.append(email)
+    set_clause = ", ".join(fields)
+
+    cursor = await conn.cursor()
+    await cursor.execute(f"UPDATE users SET {set_clause} WHERE email = %s", tuple(values))
+    await conn.commit()
+    await cursor.close()
+    invalidate_user(email)
+
+    return {"message": "User profile updated successfully"}
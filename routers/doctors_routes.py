@@ -1,42 +1,91 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
-from schemas import DoctorOut
-from utils.token import oauth2_scheme
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from db import get_async_db, async_connection
+from schemas import DoctorOut, MessageOut
 from utils.roles import require_admin
+from utils.response_cache import ResponseCache, cached_json_response
+from utils.search import catalog_search
 
 router = APIRouter(prefix="/doctors", tags=["Doctors"])
 
+DOCTOR_COLUMNS = "id, first_name, last_name, short_bio, gender, specialty, languages, rating, profile_image, city"
+DOCTORS_PAGE_SIZE = 50
+DOCTORS_MAX_PAGE_SIZE = 200
+
+doctor_list_cache = ResponseCache()
+
+
+async def fetch_doctor_page(conn, city, specialty, language, gender, min_rating, after, limit):
+    clauses, params = [], []
+    if city:
+        clauses.append("city = %s")
+        params.append(city)
+    if specialty:
+        clauses.append("specialty = %s")
+        params.append(specialty)
+    if gender:
+        clauses.append("gender = %s")
+        params.append(gender)
+    if min_rating is not None:
+        clauses.append("rating >= %s")
+        params.append(min_rating)
+    if language:
+        # languages is a comma separated list ("English,Hindi"); match whole entries only
+        clauses.append("CONCAT(',', REPLACE(languages, ' ', ''), ',') LIKE %s")
+        params.append(f"%,{language.replace(' ', '')},%")
+    if after:
+        clauses.append("id > %s")
+        params.append(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute(f"SELECT {DOCTOR_COLUMNS} FROM doctors {where} ORDER BY id LIMIT %s", (*params, limit + 1))
+    rows = await cursor.fetchall()
+    await cursor.close()
+
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    doctors = [DoctorOut.model_validate(row).model_dump() for row in rows[:limit]]
+    return doctors, next_cursor
+
+
+# The body stays a plain list of doctors; the cursor for the next page is sent in X-Next-Cursor
 @router.get("/", response_model=list[DoctorOut])
-def list_doctors():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM doctors")
-    doctors = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return doctors
+async def list_doctors(
+    request: Request,
+    city: Optional[str] = None,
+    specialty: Optional[str] = None,
+    languages: Optional[str] = None,
+    gender: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(DOCTORS_PAGE_SIZE, ge=1, le=DOCTORS_MAX_PAGE_SIZE),
+):
+    key = (city, specialty, languages, gender, min_rating, cursor, limit)
+
+    # Only a cache miss borrows a connection
+    async def build():
+        async with async_connection() as conn:
+            doctors, next_cursor = await fetch_doctor_page(conn, city, specialty, languages, gender, min_rating, cursor, limit)
+        return doctors, {"X-Next-Cursor": str(next_cursor)} if next_cursor else {}
+
+    return cached_json_response(await doctor_list_cache.get_or_build(key, build), request)
 
 @router.get("/{doctor_id}", response_model=DoctorOut)
-def get_doctor(doctor_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM doctors WHERE id = %s", (doctor_id,))
-    doctor = cursor.fetchone()
-    cursor.close()
-    conn.close()
+async def get_doctor(doctor_id: int, conn=Depends(get_async_db)):
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute(f"SELECT {DOCTOR_COLUMNS} FROM doctors WHERE id = %s", (doctor_id,))
+    doctor = await cursor.fetchone()
+    await cursor.close()
 
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
 # ✅ Admin-only: Add doctor
-@router.post("/")
-def add_doctor(data: dict, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+@router.post("/", response_model=MessageOut)
+async def add_doctor(data: dict, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("""
         INSERT INTO doctors (first_name, last_name, short_bio, gender, specialty, languages, rating, profile_image, city)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
     """, (
@@ -44,19 +93,18 @@ def add_doctor(data: dict, token: str = Depends(oauth2_scheme)):
         data.get("gender"), data.get("specialty"), data.get("languages"),
         data.get("rating"), data.get("profile_image"), data.get("city")
     ))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    await conn.commit()
+    doctor_id = cursor.lastrowid
+    await cursor.close()
+    doctor_list_cache.clear()
+    catalog_search.upsert_doctor(doctor_id, data)
     return {"message": "Doctor added successfully"}
 
 # ✅ Admin-only: Edit doctor
-@router.put("/{doctor_id}")
-def update_doctor(doctor_id: int, data: dict, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+@router.put("/{doctor_id}", response_model=MessageOut)
+async def update_doctor(doctor_id: int, data: dict, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("""
         UPDATE doctors SET first_name=%s, last_name=%s, short_bio=%s, gender=%s,
         specialty=%s, languages=%s, rating=%s, profile_image=%s, city=%s
         WHERE id=%s
@@ -65,20 +113,25 @@ def update_doctor(doctor_id: int, data: dict, token: str = Depends(oauth2_scheme
         data.get("gender"), data.get("specialty"), data.get("languages"),
         data.get("rating"), data.get("profile_image"), data.get("city"), doctor_id
     ))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # MySQL counts changed rows, so 0 can also mean an identical re-save; look before 404ing
+    if not cursor.rowcount:
+        await cursor.execute("SELECT id FROM doctors WHERE id=%s", (doctor_id,))
+        if await cursor.fetchone() is None:
+            await cursor.close()
+            raise HTTPException(status_code=404, detail="Doctor not found")
+    await conn.commit()
+    await cursor.close()
+    doctor_list_cache.clear()
+    catalog_search.upsert_doctor(doctor_id, data)
     return {"message": "Doctor updated successfully"}
 
 # ✅ Admin-only: Delete doctor
-@router.delete("/{doctor_id}")
-def delete_doctor(doctor_id: int, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM doctors WHERE id = %s", (doctor_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+@router.delete("/{doctor_id}", response_model=MessageOut)
+async def delete_doctor(doctor_id: int, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("DELETE FROM doctors WHERE id = %s", (doctor_id,))
+    await conn.commit()
+    await cursor.close()
+    doctor_list_cache.clear()
+    catalog_search.remove("doctor", doctor_id)
     return {"message": "Doctor deleted successfully"}
@@ -0,0 +1,29 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from db import get_pool_stats
+from auth import password_hasher
+from utils.jobs import scan_queue
+from utils.metrics import CollectedGauge, register, render, METRICS_TOKEN
+
+router = APIRouter(tags=["Metrics"])
+
+# Point-in-time pool and queue levels, read when Prometheus scrapes
+register(CollectedGauge("db_pool_in_use", "Pooled DB connections checked out", lambda: get_pool_stats()["in_use"]))
+register(CollectedGauge("db_pool_idle", "Pooled DB connections idle", lambda: get_pool_stats()["idle"]))
+register(CollectedGauge("db_pool_timeouts", "Requests that timed out waiting for a DB connection",
+                        lambda: get_pool_stats()["timeouts"]))
+register(CollectedGauge("password_hash_queue_depth", "bcrypt jobs waiting for a worker",
+                        lambda: password_hasher.snapshot()["queue_depth"]))
+register(CollectedGauge("password_hash_rejected", "bcrypt jobs rejected because the queue was full",
+                        lambda: password_hasher.snapshot()["rejected"]))
+register(CollectedGauge("scan_jobs_queued", "Scan jobs waiting to start", lambda: scan_queue.stats()["queued"]))
+register(CollectedGauge("scan_jobs_running", "Scan jobs in progress", lambda: scan_queue.stats()["running"]))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
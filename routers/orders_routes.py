@@ -1,133 +1,218 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
-from jose import jwt, JWTError
-from auth import SECRET_KEY, ALGORITHM
-from utils.token import oauth2_scheme
-from schemas import StatusUpdate
+import json
+import base64
+import hashlib
+from decimal import Decimal
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from db import get_async_db, async_transaction, IntegrityError
+from utils.token import get_current_user
+from schemas import StatusUpdate, BulkStatusUpdate, OrderCreate, OrderPlaced, OrderPage, OrderDetail, BulkStatusOut, MessageOut
 from utils.roles import require_admin
+from utils.status import ORDER_TRANSITIONS, bulk_transition
+from utils.analytics import record_order, record_order_status
+from utils.serialization import FastJSONResponse
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
-@router.post("/")
-def create_order(order: dict, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id FROM users WHERE email = %s", (user_email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        items = order.get("items", [])
-        if not items:
-            raise HTTPException(status_code=400, detail="Order must contain items")
-
-        total_price = sum(item["quantity"] * item["price"] for item in items)
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+
+
+async def find_idempotent_order(conn, user_id, key, request_hash):
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute("""
+        SELECT request_hash, order_id FROM order_idempotency_keys
+        WHERE user_id = %s AND idempotency_key = %s
+    """, (user_id, key))
+    row = await cursor.fetchone()
+    await cursor.close()
+    if not row:
+        return None
+    if row["request_hash"] != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    return FastJSONResponse({"message": "Order placed successfully", "order_id": row["order_id"]},
+                            headers={"Idempotent-Replayed": "true"})
+
+
+@router.post("/", response_model=OrderPlaced)
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=64),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_async_db),
+):
+    if not order.items:
+        raise HTTPException(status_code=400, detail="Order must contain items")
+
+    # Merge repeated lines for the same product
+    quantities = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    request_hash = None
+    if idempotency_key:
+        request_hash = hashlib.sha256(json.dumps(sorted(quantities.items())).encode()).hexdigest()
+        replay = await find_idempotent_order(conn, user["id"], idempotency_key, request_hash)
+        if replay:
+            return replay
 
-        cursor.execute("INSERT INTO orders (user_id, total_price, status) VALUES (%s, %s, %s)",
-                       (user["id"], total_price, "pending"))
-        order_id = cursor.lastrowid
-
-        for item in items:
-            cursor.execute("""
+    try:
+        async with async_transaction(conn):
+            cursor = await conn.cursor(dictionary=True)
+            # Prices always come from the catalog, never from the client
+            placeholders = ", ".join(["%s"] * len(quantities))
+            await cursor.execute(f"SELECT id, price FROM products WHERE id IN ({placeholders})", tuple(quantities))
+            prices = {row["id"]: Decimal(str(row["price"])) for row in await cursor.fetchall()}
+            missing = sorted(set(quantities) - set(prices))
+            if missing:
+                raise HTTPException(status_code=400, detail=f"Unknown product ids: {missing}")
+
+            if idempotency_key:
+                # The unique (user_id, idempotency_key) index makes a concurrent retry fail here
+                await cursor.execute("""
+                    INSERT INTO order_idempotency_keys (user_id, idempotency_key, request_hash)
+                    VALUES (%s, %s, %s)
+                """, (user["id"], idempotency_key, request_hash))
+                key_id = cursor.lastrowid
+
+            total_price = sum(prices[pid] * qty for pid, qty in quantities.items())
+            await cursor.execute("INSERT INTO orders (user_id, total_price, status) VALUES (%s, %s, %s)",
+                           (user["id"], total_price, "pending"))
+            order_id = cursor.lastrowid
+
+            await cursor.executemany("""
                 INSERT INTO order_items (order_id, product_id, quantity, price)
                 VALUES (%s, %s, %s, %s)
-            """, (order_id, item["product_id"], item["quantity"], item["price"]))
-
-        conn.commit()
-        return {"message": "Order placed successfully", "order_id": order_id}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
+            """, [(order_id, pid, qty, prices[pid]) for pid, qty in quantities.items()])
 
+            if idempotency_key:
+                await cursor.execute("UPDATE order_idempotency_keys SET order_id = %s WHERE id = %s", (order_id, key_id))
+            await cursor.close()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        replay = await find_idempotent_order(conn, user["id"], idempotency_key, request_hash)
+        if not replay:
+            raise
+        return replay
 
-@router.get("/")
-def get_user_orders(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id FROM users WHERE email=%s", (email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    await record_order(conn, total_price)
+    return {"message": "Order placed successfully", "order_id": order_id}
 
-        cursor.execute("SELECT * FROM orders WHERE user_id = %s", (user["id"],))
-        orders = cursor.fetchall()
-        return {"orders": orders}
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
+def encode_cursor(order):
+    return base64.urlsafe_b64encode(json.dumps([str(order["created_at"]), order["id"]]).encode()).decode()
 
 
-@router.get("/{order_id}")
-def get_order_detail(order_id: int, token: str = Depends(oauth2_scheme)):
+def decode_cursor(cursor):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        cursor.execute("SELECT * FROM orders WHERE id = %s AND user_id = %s", (order_id, user["id"]))
-        order = cursor.fetchone()
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-
-        cursor.execute("""
-            SELECT 
-                oi.product_id, 
-                p.name AS product_name,
-                p.image_url,
-                oi.quantity,
-                oi.price
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(order_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/", response_model=OrderPage)
+async def get_user_orders(
+    status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_async_db),
+):
+    # Newest first, keyset-paged on (created_at, id) using idx_orders_user_created
+    clauses, params = ["user_id = %s"], [user["id"]]
+    if status:
+        clauses.append("status = %s")
+        params.append(status)
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        clauses.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params += [created_at, created_at, order_id]
+
+    db_cursor = await conn.cursor(dictionary=True)
+    await db_cursor.execute(f"""
+        SELECT id, user_id, total_price, status, created_at FROM orders
+        WHERE {' AND '.join(clauses)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, (*params, limit + 1))
+    orders = await db_cursor.fetchall()
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+
+    # All line items for the page in one query instead of one GET /orders/{id} per order
+    by_id = {order["id"]: order for order in orders}
+    for order in orders:
+        order["items"] = []
+    if by_id:
+        placeholders = ", ".join(["%s"] * len(by_id))
+        await db_cursor.execute(f"""
+            SELECT oi.order_id, oi.product_id, p.name AS product_name, p.image_url, oi.quantity, oi.price
             FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = %s
-        """, (order_id,))
-        items = cursor.fetchall()
-
-        return {"order": order, "items": items}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
-
-
-@router.put("/{order_id}/status")
-def update_order_status(order_id: int, status_update: StatusUpdate, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    valid_statuses = ["pending", "confirmed", "shipped", "delivered", "cancelled"]
-    if status_update.status not in valid_statuses:
+            LEFT JOIN products p ON oi.product_id = p.id
+            WHERE oi.order_id IN ({placeholders})
+            ORDER BY oi.id
+        """, tuple(by_id))
+        for item in await db_cursor.fetchall():
+            by_id[item.pop("order_id")]["items"].append(item)
+    await db_cursor.close()
+
+    return {"orders": orders, "next_cursor": next_cursor}
+
+
+@router.get("/{order_id}", response_model=OrderDetail)
+async def get_order_detail(order_id: int, user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    cursor = await conn.cursor(dictionary=True)
+
+    await cursor.execute("""
+        SELECT id, user_id, total_price, status, created_at FROM orders WHERE id = %s AND user_id = %s
+    """, (order_id, user["id"]))
+    order = await cursor.fetchone()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    await cursor.execute("""
+        SELECT 
+            oi.product_id, 
+            p.name AS product_name,
+            p.image_url,
+            oi.quantity,
+            oi.price
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id = %s
+    """, (order_id,))
+    items = await cursor.fetchall()
+    await cursor.close()
+
+    return {"order": order, "items": items}
+
+
+# Declared before /{order_id}/status so "bulk" isn't taken for an order id
+@router.put("/bulk/status", response_model=BulkStatusOut, response_model_exclude_none=True)
+async def bulk_update_order_status(update: BulkStatusUpdate, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    changed = []
+    async with async_transaction(conn):
+        result = await bulk_transition(conn, "orders", ORDER_TRANSITIONS, update.ids, update.status,
+                                       columns=("total_price", "created_at"), on_updated=changed.extend)
+    await record_order_status(conn, update.status, changed)
+    return result
+
+
+@router.put("/{order_id}/status", response_model=MessageOut)
+async def update_order_status(order_id: int, status_update: StatusUpdate, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    # Same status set as the bulk endpoint; this one doesn't enforce the transitions
+    if status_update.status not in ORDER_TRANSITIONS:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (status_update.status, order_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    async with async_transaction(conn):
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute("SELECT status, total_price, created_at FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+        order = await cursor.fetchone()
+        await cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (status_update.status, order_id))
+        await cursor.close()
+    if order and order["status"] != status_update.status:
+        await record_order_status(conn, status_update.status, [order])
 
     return {"message": f"Order status updated to '{status_update.status}'"}
@@ -1,70 +1,101 @@
-from fastapi import APIRouter, HTTPException, Depends
-from db import get_connection
-from utils.token import oauth2_scheme
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from db import get_async_db
 from utils.roles import require_admin
+from utils.catalog import product_catalog, PRODUCT_FIELDS, CATALOG_MAX_AGE
+from utils.response_cache import conditional_json_response
+from utils.search import catalog_search
+from schemas import ProductOut, ProductPage, MessageOut
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
-@router.get("/")
-def list_products():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM products")
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return {"products": products}
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 200
 
-@router.get("/{product_id}")
-def get_product(product_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM products WHERE id = %s", (product_id,))
-    product = cursor.fetchone()
-    cursor.close()
-    conn.close()
+
+def parse_fields(fields):
+    if not fields:
+        return PRODUCT_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = set(requested) - set(PRODUCT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return ("id", *[f for f in PRODUCT_FIELDS if f in requested and f != "id"])
+
+
+@router.get("/", response_model=ProductPage)
+async def list_products(
+    request: Request,
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    fields: Optional[str] = Query(None, description="Comma separated subset, e.g. id,name,price,image_url"),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+):
+    columns = parse_fields(fields)
+    snapshot = await product_catalog.get()
+
+    def build():
+        products, next_cursor = snapshot.page(category, min_price, max_price, cursor, limit)
+        return {
+            "products": [{f: p[f] for f in columns} for p in products],
+            "next_cursor": next_cursor,
+        }
+
+    etag = snapshot.etag(category, min_price, max_price, columns, cursor, limit)
+    return conditional_json_response(request, etag, build, CATALOG_MAX_AGE)
+
+@router.get("/{product_id}", response_model=ProductOut)
+async def get_product(product_id: int, request: Request):
+    snapshot = await product_catalog.get()
+    product = snapshot.by_id.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return conditional_json_response(request, snapshot.etag(product_id), lambda: product, CATALOG_MAX_AGE)
 
 # ✅ Admin-only endpoint
-@router.post("/")
-def add_product(product: dict, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+@router.post("/", response_model=MessageOut)
+async def add_product(product: dict, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("""
         INSERT INTO products (name, description, image_url, price, category)
         VALUES (%s, %s, %s, %s, %s)
     """, (product["name"], product["description"], product["image_url"], product["price"], product["category"]))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    await conn.commit()
+    product_id = cursor.lastrowid
+    await cursor.close()
+    await product_catalog.refresh(conn)
+    catalog_search.upsert_product(product_id, product)
     return {"message": "Product added"}
 
 # ✅ Admin-only endpoint
-@router.put("/{product_id}")
-def update_product(product_id: int, product: dict, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+@router.put("/{product_id}", response_model=MessageOut)
+async def update_product(product_id: int, product: dict, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("""
         UPDATE products SET name=%s, description=%s, image_url=%s, price=%s, category=%s
         WHERE id=%s
     """, (product["name"], product["description"], product["image_url"], product["price"], product["category"], product_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # MySQL counts changed rows, so 0 can also mean an identical re-save; look before 404ing
+    if not cursor.rowcount:
+        await cursor.execute("SELECT id FROM products WHERE id=%s", (product_id,))
+        if await cursor.fetchone() is None:
+            await cursor.close()
+            raise HTTPException(status_code=404, detail="Product not found")
+    await conn.commit()
+    await cursor.close()
+    await product_catalog.refresh(conn)
+    catalog_search.upsert_product(product_id, product)
     return {"message": "Product updated"}
 
 # ✅ Admin-only endpoint
-@router.delete("/{product_id}")
-def delete_product(product_id: int, token: str = Depends(oauth2_scheme)):
-    require_admin(token)
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM products WHERE id=%s", (product_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+@router.delete("/{product_id}", response_model=MessageOut)
+async def delete_product(product_id: int, admin: dict = Depends(require_admin), conn=Depends(get_async_db)):
+    cursor = await conn.cursor()
+    await cursor.execute("DELETE FROM products WHERE id=%s", (product_id,))
+    await conn.commit()
+    await cursor.close()
+    await product_catalog.refresh(conn)
+    catalog_search.remove("product", product_id)
     return {"message": "Product deleted"}
@@ -1,9 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
-from jose import jwt, JWTError
-from db import get_connection
-from schemas import UpdateUserProfile
-from auth import SECRET_KEY, ALGORITHM
-from utils.token import oauth2_scheme
+from db import get_async_db
+from schemas import UpdateUserProfile, PROFILE_COLUMNS, MessageOut
+from utils.token import get_current_claims, invalidate_user
 from pydantic import BaseModel
 import json
 
@@ -12,94 +10,74 @@ router = APIRouter(prefix="/profile", tags=["User Profile"])
 from schemas import UserAdmin, UserPatient
 
 @router.get("/", response_model=UserAdmin | UserPatient)
-def get_user_profile(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        role = payload.get("role")
+async def get_user_profile(claims: dict = Depends(get_current_claims), conn=Depends(get_async_db)):
+    email = claims.get("sub")
+    role = claims.get("role")
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+    cursor = await conn.cursor(dictionary=True)
+    columns = PROFILE_COLUMNS["admin" if role == "admin" else "patient"]
+    await cursor.execute(f"SELECT {columns} FROM users WHERE email=%s", (email,))
+    user = await cursor.fetchone()
+    await cursor.close()
 
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        if role == "admin":
-            return UserAdmin(**user)
+    if role == "admin":
+        return UserAdmin(**user)
 
-        for key in ["symptoms", "previous_treatments"]:
-            if user.get(key):
-                try:
-                    user[key] = json.loads(user[key])
-                except:
-                    user[key] = []
+    for key in ["symptoms", "previous_treatments"]:
+        if user.get(key):
+            try:
+                user[key] = json.loads(user[key])
+            except:
+                user[key] = []
 
-        return UserPatient(**user)
+    return UserPatient(**user)
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 
+@router.put("/", response_model=MessageOut)
+async def update_profile(data: UpdateUserProfile, claims: dict = Depends(get_current_claims), conn=Depends(get_async_db)):
+    email = claims.get("sub")
 
-@router.put("/")
-def update_profile(data: UpdateUserProfile, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
+    fields = []
+    values = []
 
-        fields = []
-        values = []
+    for field, value in data.dict(exclude_unset=True).items():
+        if field in ["symptoms", "previous_treatments"] and value is not None:
+            fields.append(f"{field} = %s")
+            values.append(json.dumps(value))
+        elif value is not None:
+            fields.append(f"{field} = %s")
+            values.append(value)
 
-        for field, value in data.dict(exclude_unset=True).items():
-            if field in ["symptoms", "previous_treatments"] and value is not None:
-                fields.append(f"{field} = %s")
-                values.append(json.dumps(value))
-            elif value is not None:
-                fields.append(f"{field} = %s")
-                values.append(value)
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields provided")
 
-        if not fields:
-            raise HTTPException(status_code=400, detail="No fields provided")
+    values.append(email)
+    set_clause = ", ".join(fields)
 
-        values.append(email)
-        set_clause = ", ".join(fields)
+    cursor = await conn.cursor()
+    await cursor.execute(f"UPDATE users SET {set_clause} WHERE email = %s", tuple(values))
+    await conn.commit()
+    await cursor.close()
+    invalidate_user(email)
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"UPDATE users SET {set_clause} WHERE email = %s", tuple(values))
-        conn.commit()
-
-        return {"message": "User profile updated successfully"}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
+    return {"message": "User profile updated successfully"}
 
 
 class AvatarUpload(BaseModel):
     avatar_url: str
 
-@router.post("/avatar")
-def upload_avatar(payload: AvatarUpload, token: str = Depends(oauth2_scheme)):
-    try:
-        payload_data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload_data.get("sub")
-
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET avatar_url = %s WHERE email = %s", (payload.avatar_url, email))
-        conn.commit()
+@router.post("/avatar", response_model=MessageOut)
+async def upload_avatar(payload: AvatarUpload, claims: dict = Depends(get_current_claims), conn=Depends(get_async_db)):
+    email = claims.get("sub")
 
-        return {"message": "Avatar uploaded successfully"}
+    cursor = await conn.cursor()
+    await cursor.execute("UPDATE users SET avatar_url = %s WHERE email = %s", (payload.avatar_url, email))
+    await conn.commit()
+    await cursor.close()
+    invalidate_user(email)
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    finally:
-        cursor.close()
-        conn.close()
+    return {"message": "Avatar uploaded successfully"}
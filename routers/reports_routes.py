@@ -0,0 +1,75 @@
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from utils.storage import report_storage, verify_signature, run_io, aiter_range
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+def parse_range(header, size):
+    # Single byte ranges only ("bytes=0-99", "bytes=100-", "bytes=-500"); anything else serves the full body
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                raise ValueError
+            return max(size - length, 0), size - 1
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+    if first > last or first >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return first, last
+
+def not_modified(request, info):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return info.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(info.modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"])
+async def download_report(key: str, request: Request, expires: int = Query(0), sig: str = Query("")):
+    # Reports written before per-user keys existed sit at the top level and stay publicly readable
+    if "/" in key and not verify_signature(key, expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+
+    info = await run_io(report_storage.stat, key)
+    if not info:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    headers = {
+        "ETag": info.etag,
+        "Last-Modified": formatdate(info.modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f'inline; filename="{key.rsplit("/", 1)[-1]}"',
+    }
+    if not_modified(request, info):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get("range"), info.size)
+    if_range = request.headers.get("if-range")
+    if byte_range and if_range and if_range != info.etag:
+        byte_range = None
+
+    status_code = 200
+    start, end = 0, info.size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD" or info.size == 0:
+        return Response(status_code=status_code, headers=headers, media_type="application/pdf")
+    return StreamingResponse(aiter_range(key, start, end), status_code=status_code,
+                             headers=headers, media_type="application/pdf")
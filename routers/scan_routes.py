@@ -1,29 +1,60 @@
 from datetime import datetime, date
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List
-from jose import jwt, JWTError
-from db import get_connection
-from utils.token import oauth2_scheme
-from auth import SECRET_KEY, ALGORITHM
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from db import get_async_db, async_connection, async_transaction
+from utils.token import get_current_claims, get_current_user
+from utils.jobs import scan_queue, QueueFull, UserLimitExceeded
+from utils.inference import build_inference_client, InferenceUnavailable
+from utils.diagnosis_cache import diagnosis_cache
+from utils.images import read_upload, check_pixels, preprocess_image
+from utils.pdf_report import NativeReportTemplate, convert_docx
+from utils.report_template import ReloadingTemplate, CompiledDocxTemplate
+from utils.storage import report_storage, signed_report_url
+from utils.analytics import record_scan
+from utils.scan_parser import parse_scan, JSON_RESPONSE_INSTRUCTIONS
+from utils.metrics import span
+from utils.serialization import FastJSONResponse
+from schemas import ScanResult, ScanJobOut, ScanPage, ScanDetail
 from dotenv import load_dotenv
-from docxtpl import DocxTemplate, InlineImage
+from docxtpl import InlineImage
 from docx.shared import Inches
-from docx2pdf import convert
-from PIL import Image as PILImage
 from io import BytesIO
 import os
 import ast
+import json
+import uuid
+import hashlib
+import asyncio
+import tempfile
 import google.generativeai as genai
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel("models/gemini-1.5-flash")
+inference_client = build_inference_client(model)
 
 router = APIRouter(prefix="/scans", tags=["Scan Management"])
 
 TEMPLATE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "templates", "scan_report_template.docx"))
-REPORTS_DIR = "reports"
-os.makedirs(REPORTS_DIR, exist_ok=True)
+MAX_SCAN_IMAGES = 5  # image_1..image_5 placeholders in the report template
+
+# "native" draws the PDF directly; "docx" renders the Word template and converts it with an office suite
+REPORT_RENDERER = os.getenv("REPORT_RENDERER", "native")
+# Parsed once per worker and reloaded when the template file changes
+report_template = ReloadingTemplate(
+    TEMPLATE_PATH, NativeReportTemplate if REPORT_RENDERER == "native" else CompiledDocxTemplate
+)
+
+# The user fields printed on the report, plus id for the report key
+REPORT_USER_COLUMNS = ("id, email, first_name, last_name, gender, date_of_birth, contact_number, address, "
+                       "symptoms, previous_treatments, brushing_frequency, tobacco_use")
+
+# "sync" keeps the request open until the PDF is ready; "job" returns a job id immediately
+SCAN_PROCESSING_MODE = os.getenv("SCAN_PROCESSING_MODE", "sync")
+
+# "text" asks for the headed report below; "json" asks for a JSON object so parsing is a plain decode
+SCAN_RESPONSE_FORMAT = os.getenv("SCAN_RESPONSE_FORMAT", "text")
 
 CLINICAL_PROMPT = """You are to act as a highly experienced and formally trained dentist with over fifty years of distinguished clinical practice in diagnosing and treating a wide range of dental conditions. When an image is uploaded, examine it thoroughly and deliver a precise, professional diagnosis of any identifiable dental condition. Following the diagnosis, provide an in-depth explanation of the condition in clear, clinical yet comprehensible language.
 Based on the image, assess and state the potential severity of the condition as a percentage. You must state the severity directly in numeric form such as 85%, and refrain from using phrases such as 'it's difficult to give an exact percentage without further clinical examination'. Your assessment must be image-based and precise.
@@ -44,6 +75,7 @@ Call for Action
 [Formally advise whether the user must see a dentist urgently or continue monitoring, based on the severity]
 Speak as if addressing a real patient in a clinical setting, not as a chatbot. Your language must reflect deep clinical expertise, compassion, and clarity. Do not use informal language, markdown, bullet points, symbols, or AI disclaimers. Your response must always reflect the communication style of a senior dental consultant who has spent a lifetime in clinical care.
 """
+SCAN_PROMPT = CLINICAL_PROMPT + JSON_RESPONSE_INSTRUCTIONS if SCAN_RESPONSE_FORMAT == "json" else CLINICAL_PROMPT
 
 def calculate_age(dob_str):
     try:
@@ -65,134 +97,295 @@ def safe_list(value):
     else:
         return [str(value)]
 
-@router.post("/")
-async def analyze_scan(files: List[UploadFile] = File(...), token: str = Depends(oauth2_scheme)):
-    converted_image_paths = []
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if not email:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Fetch user
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        # Validate and convert uploaded images
-        image_parts = []
-        for file in files:
-            content = await file.read()
-            try:
-                img = PILImage.open(BytesIO(content))
-                converted_path = os.path.join(REPORTS_DIR, f"converted_{datetime.utcnow().timestamp()}.png")
-                img.convert("RGB").save(converted_path, format="PNG")
-                image_parts.append({
-                    "mime_type": "image/png",
-                    "data": open(converted_path, "rb").read()
-                })
-                converted_image_paths.append(converted_path)
-            except Exception as e:
-                print(f"[ERROR] Invalid image '{file.filename}':", str(e))
-
-        if not converted_image_paths:
-            raise HTTPException(status_code=400, detail="No valid image files uploaded.")
-
-        # AI Diagnosis
-        full_text = ""
-        for idx, part in enumerate(image_parts):
-            response = model.generate_content([CLINICAL_PROMPT, part])
-            full_text += f"\n--- Analysis for Image {idx + 1} ---\n{response.text.strip()}\n"
-
-        # Parse response
-        sections = {
-            "Dental Condition Name": "",
-            "Information About the Condition": "",
-            "Severity Percentage": "",
-            "Home Cure or Remedy": "",
-            "Dietary Options or Food Solutions": "",
-            "Call for Action": ""
-        }
-        current = None
-        for line in full_text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line in sections:
-                current = line
-            elif current:
-                sections[current] += line + " "
-
-        # Fill context
-        age = calculate_age(str(user.get("date_of_birth")))
-        context = {
-            "first_name": user.get("first_name"),
-            "last_name": user.get("last_name"),
-            "email": user.get("email"),
-            "gender": user.get("gender", "N/A"),
-            "date_of_birth": str(user.get("date_of_birth")),
-            "age": age,
-            "contact_number": user.get("contact_number", "N/A"),
-            "address": user.get("address", "N/A"),
-            "symptoms": ", ".join(safe_list(user.get("symptoms"))),
-            "previous_treatments": ", ".join(safe_list(user.get("previous_treatments"))),
-            "brushing_frequency": user.get("brushing_frequency", "N/A"),
-            "tobacco_use": "Yes" if str(user.get("tobacco_use", "")).lower() in ["1", "true", "yes"] else "No",
-            "condition": sections["Dental Condition Name"].strip(),
-            "severity": sections["Severity Percentage"].strip(),
-            "info": sections["Information About the Condition"].strip(),
-            "remedy": sections["Home Cure or Remedy"].strip(),
-            "diet": sections["Dietary Options or Food Solutions"].strip(),
-            "action": sections["Call for Action"].strip(),
-        }
+def prepare_images(uploads):
+    # One in-memory decode per upload yields both the model payload and the report thumbnail
+    image_parts = []
+    thumbnails = []
+    for filename, content in uploads:
+        try:
+            png_bytes, thumbnail = preprocess_image(content)
+            image_parts.append({
+                "mime_type": "image/png",
+                "data": png_bytes
+            })
+            thumbnails.append(thumbnail)
+        except Exception as e:
+            print(f"[ERROR] Invalid image '{filename}':", str(e))
+    return image_parts, thumbnails
+
+def lookup_cached_diagnoses(image_parts):
+    return [diagnosis_cache.get(part["data"], SCAN_PROMPT, inference_client.model_name) for part in image_parts]
+
+def store_diagnoses(image_parts, texts):
+    for part, text in zip(image_parts, texts):
+        diagnosis_cache.put(part["data"], SCAN_PROMPT, inference_client.model_name, text)
+
+async def run_diagnosis(image_parts):
+    # Re-uploaded images are answered from the cache; only the misses go to the model
+    texts = await asyncio.to_thread(lookup_cached_diagnoses, image_parts)
+    missing = [i for i, text in enumerate(texts) if text is None]
 
-        # Prepare template and image placeholders
-        doc = DocxTemplate(TEMPLATE_PATH)
-        for i in range(5):
-            key = f"image_{i + 1}"
-            if i < len(converted_image_paths):
-                context[key] = InlineImage(doc, converted_image_paths[i], width=Inches(2))
-            else:
-                context[key] = ""
-
-        # Save DOCX and convert to PDF
-        timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
-        docx_name = f"{email.replace('@', '_')}_{timestamp}.docx"
-        pdf_name = docx_name.replace(".docx", ".pdf")
-        docx_path = os.path.join(REPORTS_DIR, docx_name)
-        pdf_path = os.path.join(REPORTS_DIR, pdf_name)
+    if missing:
+        # Per-image calls run concurrently (or as one batched call) off the event loop
+        try:
+            fresh = await inference_client.analyze(SCAN_PROMPT, [image_parts[i] for i in missing])
+        except InferenceUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        for i, text in zip(missing, fresh):
+            texts[i] = text
+        await asyncio.to_thread(store_diagnoses, [image_parts[i] for i in missing], fresh)
+
+    return texts
+
+def build_context(user, findings):
+    age = calculate_age(str(user.get("date_of_birth")))
+    return {
+        "first_name": user.get("first_name"),
+        "last_name": user.get("last_name"),
+        "email": user.get("email"),
+        "gender": user.get("gender", "N/A"),
+        "date_of_birth": str(user.get("date_of_birth")),
+        "age": age,
+        "contact_number": user.get("contact_number", "N/A"),
+        "address": user.get("address", "N/A"),
+        "symptoms": ", ".join(safe_list(user.get("symptoms"))),
+        "previous_treatments": ", ".join(safe_list(user.get("previous_treatments"))),
+        "brushing_frequency": user.get("brushing_frequency", "N/A"),
+        "tobacco_use": "Yes" if str(user.get("tobacco_use", "")).lower() in ["1", "true", "yes"] else "No",
+        "condition": findings.condition,
+        "severity": f"{findings.severity}%" if findings.severity is not None else "N/A",
+        "info": findings.information,
+        "remedy": findings.remedy,
+        "diet": findings.diet,
+        "action": findings.action,
+    }
+
+def report_key(user_id):
+    timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+    return f"users/{user_id}/{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
+
+def render_native_report(context, thumbnails, key):
+    with span("report.render"):
+        pdf = report_template.get().render(context, thumbnails)
+    report_storage.put(key, pdf)
+    return key
+
+def render_report(context, thumbnails, workdir):
+    # Prepare template and image placeholders
+    doc = report_template.get().new()
+    for i in range(MAX_SCAN_IMAGES):
+        key = f"image_{i + 1}"
+        if i < len(thumbnails):
+            context[key] = InlineImage(doc, BytesIO(thumbnails[i]), width=Inches(2))
+        else:
+            context[key] = ""
 
+    docx_path = os.path.join(workdir, "report.docx")
+
+    with span("report.render"):
         doc.render(context)
-        doc.save(docx_path)
-        convert(docx_path, pdf_path)
-        os.remove(docx_path)  # <- this will delete the .docx file after PDF is created
-
-        # Clean up temporary images
-        for path in converted_image_paths:
-            try:
-                os.remove(path)
-            except:
-                pass
-
-        public_ip = os.getenv("PUBLIC_SERVER_IP", "127.0.0.1")
-        report_url = f"http://{public_ip}:8000/reports/{pdf_name}"
-
-        return {
-            "email": email,
-            "pdf_url": report_url,
-            "analysis": {
-                "condition": context["condition"],
-                "severity": context["severity"],
-                "action": context["action"]
-            }
+    doc.save(docx_path)
+    return docx_path
+
+def convert_report(docx_path, key):
+    pdf_path = docx_path.replace(".docx", ".pdf")
+    with span("report.convert"):
+        convert_docx(docx_path, pdf_path)
+    with open(pdf_path, "rb") as f:
+        report_storage.put(key, f.read())
+    return key
+
+def describe_uploads(uploads):
+    return [{"filename": filename, "sha256": hashlib.sha256(content).hexdigest()} for filename, content in uploads]
+
+async def save_scan(user_id, findings, image_refs, key):
+    # Borrowed only for the insert, not for the whole scan
+    async with async_connection() as conn:
+        async with async_transaction(conn):
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                INSERT INTO scans (user_id, detected_conditions, severity, ai_feedback, image_refs, report_key)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (user_id, findings.condition, findings.severity,
+                  findings.model_dump_json(), json.dumps(image_refs), key))
+            scan_id = cursor.lastrowid
+            await cursor.close()
+        await record_scan(conn, findings.severity)
+    return scan_id
+
+async def process_scan(job, user, uploads, base_url):
+    # Each blocking step runs on its own bounded stage pool, off the event loop
+    image_parts, thumbnails = await scan_queue.run_stage(job, "prepare", prepare_images, uploads)
+    if not image_parts:
+        raise HTTPException(status_code=400, detail="No valid image files uploaded.")
+
+    job.update(stage="ai")
+    texts = await run_diagnosis(image_parts)
+    findings = parse_scan(texts)
+    context = build_context(user, findings)
+    key = report_key(user["id"])
+    if REPORT_RENDERER == "native":
+        await scan_queue.run_stage(job, "render", render_native_report, context, thumbnails, key)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            docx_path = await scan_queue.run_stage(job, "render", render_report, context, thumbnails, workdir)
+            await scan_queue.run_stage(job, "convert", convert_report, docx_path, key)
+
+    # Kept so history views never have to re-run inference or rendering
+    image_refs = await asyncio.to_thread(describe_uploads, uploads)
+    scan_id = await save_scan(user["id"], findings, image_refs, key)
+
+    return {
+        "scan_id": scan_id,
+        "email": user["email"],
+        "pdf_url": signed_report_url(key, base_url),
+        "report_key": key,
+        "analysis": {
+            "condition": context["condition"],
+            "severity": context["severity"],
+            "action": context["action"],
+            "images": [
+                {"condition": image.condition, "severity": image.severity, "action": image.action}
+                for image in findings.images
+            ]
         }
+    }
+
+def get_owned_job(job_id, email):
+    job = scan_queue.get(job_id)
+    if not job or job.owner != email:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/", response_model=ScanResult, responses={202: {"description": "Queued (mode=job)"}})
+async def analyze_scan(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    mode: Optional[str] = Query(None, pattern="^(sync|job)$"),
+    claims: dict = Depends(get_current_claims)
+):
+    email = claims["sub"]
+
+    # A scan can take many seconds, so the connection is given back right after this lookup
+    async with async_connection() as conn:
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute(f"SELECT {REPORT_USER_COLUMNS} FROM users WHERE email=%s", (email,))
+        user = await cursor.fetchone()
+        await cursor.close()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if len(files) > MAX_SCAN_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SCAN_IMAGES} images per scan")
+
+    # Uploads are only readable while the request is open, so buffer them before queueing
+    uploads = [(file.filename, await read_upload(file)) for file in files]
+    for filename, content in uploads:
+        check_pixels(filename, content)
+
+    try:
+        job = scan_queue.submit(email, process_scan, user, uploads, str(request.base_url))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Scan queue is full, please retry later",
+                            headers={"Retry-After": "30"})
+    except UserLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many scans in progress for this user")
+
+    if (mode or SCAN_PROCESSING_MODE) == "job":
+        return FastJSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/scans/jobs/{job.id}",
+            "events_url": f"/scans/jobs/{job.id}/events",
+        })
+
+    while not job.finished:
+        await job.wait_for_change(job.version, timeout=30)
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status, detail=job.error)
+    return job.result
+
+@router.get("/jobs/{job_id}", response_model=ScanJobOut)
+async def get_scan_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60),
+    since: int = Query(-1),
+    claims: dict = Depends(get_current_claims)
+):
+    # Long-poll: with ?wait=N the call returns as soon as the job changes past `since`
+    job = get_owned_job(job_id, claims["sub"])
+    if wait:
+        await job.wait_for_change(since, timeout=wait)
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_scan_job(job_id: str, claims: dict = Depends(get_current_claims)):
+    job = get_owned_job(job_id, claims["sub"])
+
+    async def events():
+        version = -1
+        while True:
+            await job.wait_for_change(version, timeout=15)
+            if job.version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = job.version
+            yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# ---------- History ----------
+
+SCAN_HISTORY_PAGE_SIZE = 20
+SCAN_HISTORY_MAX_PAGE_SIZE = 100
+
+def scan_summary(row, base_url):
+    return {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "condition": row["detected_conditions"],
+        "severity": row["severity"],
+        "pdf_url": signed_report_url(row["report_key"], base_url) if row["report_key"] else None,
+    }
+
+@router.get("/", response_model=ScanPage)
+async def list_scans(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(SCAN_HISTORY_PAGE_SIZE, ge=1, le=SCAN_HISTORY_MAX_PAGE_SIZE),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_async_db)
+):
+    # Newest first, keyset-paged on id using idx_scans_user
+    query = "SELECT id, created_at, detected_conditions, severity, report_key FROM scans WHERE user_id = %s"
+    params = [user["id"]]
+    if cursor:
+        query += " AND id < %s"
+        params.append(cursor)
+    db_cursor = await conn.cursor(dictionary=True)
+    await db_cursor.execute(query + " ORDER BY id DESC LIMIT %s", (*params, limit + 1))
+    rows = await db_cursor.fetchall()
+    await db_cursor.close()
+
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    base_url = str(request.base_url)
+    return {"scans": [scan_summary(row, base_url) for row in rows[:limit]], "next_cursor": next_cursor}
+
+@router.get("/{scan_id}", response_model=ScanDetail)
+async def get_scan(scan_id: int, request: Request, user: dict = Depends(get_current_user), conn=Depends(get_async_db)):
+    db_cursor = await conn.cursor(dictionary=True)
+    await db_cursor.execute("""
+        SELECT id, created_at, detected_conditions, severity, ai_feedback, image_refs, report_key
+        FROM scans WHERE id = %s AND user_id = %s
+    """, (scan_id, user["id"]))
+    row = await db_cursor.fetchone()
+    await db_cursor.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="Scan not found")
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    scan = scan_summary(row, str(request.base_url))
+    scan["findings"] = json.loads(row["ai_feedback"]) if row["ai_feedback"] else {}
+    scan["images"] = json.loads(row["image_refs"]) if row["image_refs"] else []
+    return scan
@@ -0,0 +1,19 @@
+from typing import Literal
+from fastapi import APIRouter, Query
+from utils.search import catalog_search
+from schemas import SearchResults
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+SEARCH_KINDS = {"all": None, "products": {"product"}, "doctors": {"doctor"}}
+
+
+@router.get("", response_model=SearchResults)
+@router.get("/", response_model=SearchResults, include_in_schema=False)
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    type: Literal["all", "products", "doctors"] = "all",
+    limit: int = Query(20, ge=1, le=100),
+):
+    index = await catalog_search.get()
+    return {"results": index.search(q, SEARCH_KINDS[type], limit)}
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime
+from typing import Any, Dict, Optional, List
+from datetime import date, datetime
 from enum import Enum
 
 class GenderEnum(str, Enum):
@@ -59,9 +59,37 @@ class DoctorOut(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderItemIn(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0, le=100)
+
+class OrderCreate(BaseModel):
+    items: List[OrderItemIn] = Field(default_factory=list, max_length=50)
+
 class StatusUpdate(BaseModel):
     status: str  # You can later restrict with Enum if needed
 
+class BulkStatusUpdate(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+    status: str
+
+class ImageFindings(BaseModel):
+    condition: str = ""
+    information: str = ""
+    severity: Optional[int] = Field(None, ge=0, le=100)
+    remedy: str = ""
+    diet: str = ""
+    action: str = ""
+
+class ScanFindings(BaseModel):
+    images: List[ImageFindings] = Field(default_factory=list)
+    condition: str = ""
+    information: str = ""
+    severity: Optional[int] = Field(None, ge=0, le=100)
+    remedy: str = ""
+    diet: str = ""
+    action: str = ""
+
 class UserBase(BaseModel):
     id: int
     email: str
@@ -93,3 +121,200 @@ class UserPatient(UserBase):
     address: Optional[str] = None
     contact_number: Optional[str] = None
 
+# Columns each profile model reads, so the handlers select only those instead of SELECT *
+PROFILE_COLUMNS = {
+    "admin": ", ".join(UserAdmin.model_fields),
+    "patient": ", ".join(UserPatient.model_fields),
+}
+
+
+# ---------- Responses ----------
+# Every JSON route declares one of these as its response_model, so FastAPI validates the rows it is
+# handed and dumps them straight to bytes with pydantic-core instead of walking them with jsonable_encoder.
+
+class MessageOut(BaseModel):
+    message: str
+
+class TokenOut(BaseModel):
+    access_token: str
+    token_type: str
+
+class ProductOut(BaseModel):
+    # Fields left out of ?fields= are omitted from the response
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    price: Optional[float] = None
+    category: Optional[str] = None
+
+class ProductPage(BaseModel):
+    products: List[ProductOut]
+    next_cursor: Optional[int] = None
+
+class SearchHit(BaseModel):
+    type: str
+    id: int
+    score: float
+    item: Dict[str, Any]
+
+class SearchResults(BaseModel):
+    results: List[SearchHit]
+
+class AvailabilityOut(BaseModel):
+    doctor_id: int
+    slots: List[str]
+
+class AppointmentOut(BaseModel):
+    id: int
+    doctor_id: int
+    appointment_time: datetime
+    status: Optional[str] = None
+    doctor_name: Optional[str] = None
+    specialty: Optional[str] = None
+
+class AppointmentList(BaseModel):
+    appointments: List[AppointmentOut]
+
+class BulkStatusResult(BaseModel):
+    id: int
+    result: str
+    from_status: Optional[str] = Field(None, alias="from")
+
+class BulkStatusOut(BaseModel):
+    status: str
+    updated: int
+    results: List[BulkStatusResult]
+
+class OrderPlaced(BaseModel):
+    message: str
+    order_id: int
+
+class OrderItemOut(BaseModel):
+    product_id: int
+    product_name: Optional[str] = None
+    image_url: Optional[str] = None
+    quantity: int
+    price: float
+
+class OrderSummary(BaseModel):
+    id: int
+    user_id: int
+    total_price: float
+    status: Optional[str] = None
+    created_at: datetime
+
+class OrderOut(OrderSummary):
+    items: List[OrderItemOut]
+
+class OrderPage(BaseModel):
+    orders: List[OrderOut]
+    next_cursor: Optional[str] = None
+
+class OrderDetail(BaseModel):
+    order: OrderSummary
+    items: List[OrderItemOut]
+
+class ImageSummary(BaseModel):
+    condition: str
+    severity: Optional[int] = None
+    action: str
+
+class ScanAnalysis(BaseModel):
+    condition: str
+    severity: str  # "70%" or "N/A", as printed on the report
+    action: str
+    images: List[ImageSummary]
+
+class ScanResult(BaseModel):
+    scan_id: int
+    email: str
+    pdf_url: str
+    report_key: str
+    analysis: ScanAnalysis
+
+class ScanJobOut(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    version: int
+    result: Optional[ScanResult] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class ScanSummary(BaseModel):
+    id: int
+    created_at: datetime
+    condition: Optional[str] = None
+    severity: Optional[int] = None
+    pdf_url: Optional[str] = None
+
+class ScanPage(BaseModel):
+    scans: List[ScanSummary]
+    next_cursor: Optional[int] = None
+
+class ImageRef(BaseModel):
+    filename: Optional[str] = None
+    sha256: str
+
+class ScanDetail(ScanSummary):
+    findings: Dict[str, Any]  # the stored ScanFindings, as saved at the time of the scan
+    images: List[ImageRef]
+
+class RevenuePoint(BaseModel):
+    period: date
+    orders: int
+    gross: float
+    cancelled: float
+    net: float
+
+class RevenueSeries(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    series: List[RevenuePoint]
+
+class FunnelPoint(BaseModel):
+    period: date
+    pending: int
+    paid: int
+    confirmed: int
+    shipped: int
+    delivered: int
+    cancelled: int
+
+class FunnelSeries(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    series: List[FunnelPoint]
+
+class DoctorAppointmentCounts(BaseModel):
+    doctor_id: int
+    booked: int
+    completed: int
+    cancelled: int
+
+class AppointmentPoint(BaseModel):
+    period: date
+    doctors: List[DoctorAppointmentCounts]
+
+class AppointmentSeries(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    series: List[AppointmentPoint]
+
+class SeverityPoint(BaseModel):
+    period: date
+    mild: int
+    moderate: int
+    severe: int
+    unknown: int
+
+class SeveritySeries(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    series: List[SeverityPoint]
@@ -1,3 +1,5 @@
+-- Reference schema: what a database looks like after every file in migrations/ has run. Create and
+-- upgrade databases with `python -m utils.migrate up`; new changes go in a new migration, then here.
 CREATE TABLE users (
     id INT PRIMARY KEY AUTO_INCREMENT,
     email VARCHAR(100) UNIQUE,
@@ -21,7 +23,10 @@ CREATE TABLE users (
     sugary_diet BOOLEAN,
     teeth_grinding BOOLEAN,
     is_subscribed BOOLEAN DEFAULT FALSE,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    role VARCHAR(20) NOT NULL DEFAULT 'patient',
+    address VARCHAR(255),
+    contact_number VARCHAR(20)
 );
 
 CREATE TABLE doctors (
@@ -37,16 +42,42 @@ CREATE TABLE doctors (
     city VARCHAR(100)
 );
 
+-- Directory filters; each ends in id so the keyset (ORDER BY id) pages stay index-only
+CREATE INDEX idx_doctors_city ON doctors (city, id);
+CREATE INDEX idx_doctors_specialty ON doctors (specialty, id);
+CREATE INDEX idx_doctors_gender ON doctors (gender, id);
+CREATE INDEX idx_doctors_rating ON doctors (rating, id);
+
 CREATE TABLE appointments (
     id INT PRIMARY KEY AUTO_INCREMENT,
     user_id INT,
     doctor_id INT,
     appointment_time DATETIME,
     status ENUM('pending', 'confirmed', 'completed', 'cancelled'),
+    -- Copy of appointment_time while the booking holds its slot, NULL once cancelled;
+    -- the unique key makes a second concurrent booking of the same slot fail
+    active_slot DATETIME,
+    UNIQUE KEY uq_appointments_doctor_slot (doctor_id, active_slot),
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (doctor_id) REFERENCES doctors(id)
 );
 
+-- Appointment list: WHERE user_id = ? ORDER BY appointment_time
+CREATE INDEX idx_appointments_user_time ON appointments (user_id, appointment_time);
+
+-- Weekly schedule per doctor (weekday 0 = Monday, minutes since midnight); doctors without
+-- rows fall back to APPOINTMENT_DEFAULT_HOURS / APPOINTMENT_DEFAULT_DAYS
+CREATE TABLE doctor_working_hours (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    doctor_id INT NOT NULL,
+    weekday TINYINT NOT NULL,
+    start_minute SMALLINT NOT NULL,
+    end_minute SMALLINT NOT NULL,
+    slot_minutes SMALLINT NOT NULL DEFAULT 30,
+    UNIQUE KEY uq_working_hours (doctor_id, weekday, start_minute),
+    FOREIGN KEY (doctor_id) REFERENCES doctors(id) ON DELETE CASCADE
+);
+
 CREATE TABLE products (
     id INT PRIMARY KEY AUTO_INCREMENT,
     name VARCHAR(100),
@@ -60,11 +91,14 @@ CREATE TABLE orders (
     id INT PRIMARY KEY AUTO_INCREMENT,
     user_id INT,
     total_price DECIMAL(10, 2),
-    status ENUM('pending', 'paid', 'shipped', 'delivered'),
+    status ENUM('pending', 'paid', 'confirmed', 'shipped', 'delivered', 'cancelled'),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+-- Order history: WHERE user_id = ? ORDER BY created_at DESC, id DESC (InnoDB appends id to the index)
+CREATE INDEX idx_orders_user_created ON orders (user_id, created_at);
+
 CREATE TABLE order_items (
     id INT PRIMARY KEY AUTO_INCREMENT,
     order_id INT,
@@ -75,13 +109,47 @@ CREATE TABLE order_items (
     FOREIGN KEY (product_id) REFERENCES products(id)
 );
 
+-- Line items by order, and the reference check when a product is deleted
+CREATE INDEX idx_order_items_order ON order_items (order_id);
+CREATE INDEX idx_order_items_product ON order_items (product_id);
+
+-- Lets a retried POST /orders/ (same Idempotency-Key header) return the original order
+CREATE TABLE order_idempotency_keys (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    order_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_order_idempotency (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+);
+
 CREATE TABLE scans (
     id INT PRIMARY KEY AUTO_INCREMENT,
     user_id INT,
     image_url VARCHAR(255),
     oral_health_score INT,
-    ai_feedback TEXT,
+    ai_feedback TEXT,  -- JSON object of the parsed report sections
     detected_conditions TEXT,
+    severity TINYINT,  -- 0-100, parsed from "Severity Percentage"; NULL when the model gave none
+    image_refs TEXT,  -- JSON list of {"filename", "sha256"} for the uploaded images
+    report_key VARCHAR(255),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
+
+-- Scan history: WHERE user_id = ? ORDER BY id DESC
+CREATE INDEX idx_scans_user ON scans (user_id, id);
+
+-- Daily rollups for /analytics, maintained by utils/analytics.py as rows are written
+-- (dimension: order status, doctor id or scan severity band; '' when unused)
+CREATE TABLE analytics_daily (
+    bucket_date DATE NOT NULL,
+    metric VARCHAR(40) NOT NULL,
+    dimension VARCHAR(40) NOT NULL DEFAULT '',
+    event_count INT NOT NULL DEFAULT 0,
+    amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_date, metric, dimension)
+);
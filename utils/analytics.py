@@ -0,0 +1,199 @@
+# Daily rollups behind the admin analytics endpoints. Writers call the record_* helpers with their
+# async connection right after their own transaction commits; each call is one short transaction
+# of upserts, so the busy per-day rows are locked for a few statements instead of a whole checkout.
+# Every rollup is bucketed by the source row's own date (order and scan created_at, appointment
+# time), which is also what the rebuild uses. Rebuild them from scratch (sync, for the CLI and the
+# benchmark seeder) with: python -m utils.analytics backfill [--chunk 5000]
+import argparse
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from collections import defaultdict
+from db import DB_BACKEND, transaction, get_connection, async_transaction
+from utils.slots import to_datetime
+
+
+def severity_band(severity):
+    """Map a 0-100 severity to mild / moderate / severe (unknown when missing)."""
+    if severity is None:
+        return "unknown"
+    if severity < 34:
+        return "mild"
+    if severity < 67:
+        return "moderate"
+    return "severe"
+
+
+def _day(value):
+    if value is None:
+        return date.today()
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    return to_datetime(value).date()
+
+
+if DB_BACKEND == "sqlite":
+    _UPSERT = """
+        INSERT INTO analytics_daily (bucket_date, metric, dimension, event_count, amount)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (bucket_date, metric, dimension) DO UPDATE
+        SET event_count = event_count + excluded.event_count, amount = amount + excluded.amount
+    """
+else:
+    _UPSERT = """
+        INSERT INTO analytics_daily (bucket_date, metric, dimension, event_count, amount)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE event_count = event_count + VALUES(event_count), amount = amount + VALUES(amount)
+    """
+
+
+async def bump(conn, bumps):
+    """Add each (day, metric, dimension, count, amount) to its rollup row in one short transaction.
+
+    Runs after the caller's write has committed, so a failure here is logged rather than raised:
+    the request already succeeded, and a backfill repairs the rollups.
+    """
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for day, metric, dimension, count, amount in bumps:
+        entry = totals[(_day(day), metric, str(dimension))]
+        entry[0] += count
+        entry[1] += Decimal(str(amount or 0))
+    if not totals:
+        return
+    # Sorted keys, so concurrent writers lock shared rows in the same order
+    rows = [(*key, count, amount) for key, (count, amount) in sorted(totals.items())]
+    try:
+        async with async_transaction(conn):
+            cursor = await conn.cursor()
+            await cursor.executemany(_UPSERT, rows)
+            await cursor.close()
+    except Exception as e:
+        print("[ERROR] Analytics rollup update failed:", str(e))
+
+
+async def record_order(conn, total_price, created_at=None):
+    day = _day(created_at)
+    await bump(conn, [(day, "orders", "", 1, total_price), (day, "order_status", "pending", 1, total_price)])
+
+
+async def record_order_status(conn, status, orders):
+    """Count `orders` (rows with total_price and created_at) as entering `status`."""
+    await bump(conn, [(order["created_at"], "order_status", status, 1, order["total_price"]) for order in orders])
+
+
+async def record_appointment(conn, doctor_id, appointment_time):
+    await bump(conn, [(appointment_time, "appointments", doctor_id, 1, 0)])
+
+
+async def record_appointment_status(conn, status, appointments):
+    """Count `appointments` (rows with doctor_id and appointment_time) as reaching `status`."""
+    await bump(conn, [(row["appointment_time"], f"appointments_{status}", row["doctor_id"], 1, 0)
+                      for row in appointments])
+
+
+async def record_scan(conn, severity, created_at=None):
+    await bump(conn, [(created_at, "scans", severity_band(severity), 1, 0)])
+
+
+# ---------- Queries ----------
+
+def bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+async def series(conn, metrics, start, end, bucket="day", dimension=None):
+    """{(bucket_start, metric, dimension): (count, amount)} for the metrics between start and end."""
+    placeholders = ", ".join(["%s"] * len(metrics))
+    query = f"""
+        SELECT bucket_date, metric, dimension, event_count, amount FROM analytics_daily
+        WHERE metric IN ({placeholders}) AND bucket_date >= %s AND bucket_date <= %s
+    """
+    params = [*metrics, start, end]
+    if dimension is not None:
+        query += " AND dimension = %s"
+        params.append(str(dimension))
+    cursor = await conn.cursor(dictionary=True)
+    await cursor.execute(query, tuple(params))
+    rows = await cursor.fetchall()
+    await cursor.close()
+
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows:
+        key = (bucket_start(_day(row["bucket_date"]), bucket), row["metric"], row["dimension"])
+        totals[key][0] += int(row["event_count"])
+        totals[key][1] += Decimal(str(row["amount"] or 0))
+    return totals
+
+
+# ---------- Backfill ----------
+
+def _chunks(conn, query, chunk):
+    cursor = conn.cursor(dictionary=True)
+    last_id = 0
+    while True:
+        cursor.execute(query, (last_id, chunk))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1]["id"]
+    cursor.close()
+
+
+def backfill(conn, chunk=5000):
+    """Recompute every rollup from the source tables, reading them chunk rows at a time.
+
+    Order status history isn't stored, so in the funnel each existing order counts as placed
+    ("pending") plus its current status; live updates count every transition.
+    """
+    totals = defaultdict(lambda: [0, Decimal(0)])
+
+    def add(day, metric, dimension="", amount=0):
+        entry = totals[(_day(day), metric, str(dimension))]
+        entry[0] += 1
+        entry[1] += Decimal(str(amount or 0))
+
+    for rows in _chunks(conn, "SELECT id, total_price, status, created_at FROM orders WHERE id > %s ORDER BY id LIMIT %s", chunk):
+        for row in rows:
+            add(row["created_at"], "orders", "", row["total_price"])
+            add(row["created_at"], "order_status", "pending", row["total_price"])
+            if row["status"] and row["status"] != "pending":
+                add(row["created_at"], "order_status", row["status"], row["total_price"])
+
+    for rows in _chunks(conn, "SELECT id, doctor_id, appointment_time, status FROM appointments WHERE id > %s ORDER BY id LIMIT %s", chunk):
+        for row in rows:
+            add(row["appointment_time"], "appointments", row["doctor_id"])
+            if row["status"] in ("cancelled", "completed"):
+                add(row["appointment_time"], f"appointments_{row['status']}", row["doctor_id"])
+
+    for rows in _chunks(conn, "SELECT id, severity, created_at FROM scans WHERE id > %s ORDER BY id LIMIT %s", chunk):
+        for row in rows:
+            add(row["created_at"], "scans", severity_band(row["severity"]))
+
+    items = [(count, amount, day, metric, dimension) for (day, metric, dimension), (count, amount) in totals.items()]
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM analytics_daily")
+        for i in range(0, len(items), chunk):
+            cursor.executemany("""
+                INSERT INTO analytics_daily (event_count, amount, bucket_date, metric, dimension)
+                VALUES (%s, %s, %s, %s, %s)
+            """, items[i:i + chunk])
+        cursor.close()
+    return len(items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.analytics")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--chunk", type=int, default=5000)
+    args = parser.parse_args()
+    conn = get_connection()
+    try:
+        rows = backfill(conn, args.chunk)
+    finally:
+        conn.close()
+    print(f"Rebuilt analytics_daily: {rows} rollup rows")
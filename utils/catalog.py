@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+import hashlib
+from db import async_connection
+
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "60"))  # picks up other workers' writes
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))  # Cache-Control max-age for clients
+
+PRODUCT_FIELDS = ("id", "name", "description", "image_url", "price", "category")
+
+
+class CatalogSnapshot:
+    def __init__(self, rows):
+        self.products = sorted(rows, key=lambda p: p["id"])
+        self.ids = [p["id"] for p in self.products]
+        self.by_id = {p["id"]: p for p in self.products}
+        # Content-derived, so every worker holding the same data hands out the same ETags
+        self.version = hashlib.sha256(json.dumps(self.products, sort_keys=True).encode()).hexdigest()[:16]
+        self.loaded_at = time.monotonic()
+
+    def etag(self, *query):
+        return '"' + hashlib.sha256(repr((self.version, query)).encode()).hexdigest()[:32] + '"'
+
+    def page(self, category=None, min_price=None, max_price=None, after=None, limit=50):
+        start = bisect.bisect_right(self.ids, after) if after else 0
+        items = []
+        for product in self.products[start:]:
+            if category and product["category"] != category:
+                continue
+            if min_price is not None and (product["price"] is None or product["price"] < min_price):
+                continue
+            if max_price is not None and (product["price"] is None or product["price"] > max_price):
+                continue
+            items.append(product)
+            if len(items) > limit:
+                break
+        next_cursor = items[limit - 1]["id"] if len(items) > limit else None
+        return items[:limit], next_cursor
+
+
+class ProductCatalog:
+    """Immutable snapshots of the products table; admin writes call refresh() to swap in a new one.
+
+    Warm reads never touch the pool: get() only borrows a connection when the snapshot is stale.
+    """
+
+    def __init__(self, refresh_interval=CATALOG_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._lock = asyncio.Lock()
+
+    def _stale(self, snapshot):
+        return snapshot is None or time.monotonic() - snapshot.loaded_at > self.refresh_interval
+
+    async def _load(self, conn):
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute(f"SELECT {', '.join(PRODUCT_FIELDS)} FROM products")
+        rows = await cursor.fetchall()
+        await cursor.close()
+        for row in rows:
+            row["price"] = float(row["price"]) if row["price"] is not None else None
+        # Sorting and hashing the whole table is CPU work; keep it off the event loop
+        return await asyncio.to_thread(CatalogSnapshot, rows)
+
+    async def get(self):
+        snapshot = self._snapshot
+        if self._stale(snapshot):
+            async with self._lock:
+                snapshot = self._snapshot
+                if self._stale(snapshot):
+                    async with async_connection() as conn:
+                        snapshot = self._snapshot = await self._load(conn)
+        return snapshot
+
+    async def refresh(self, conn):
+        async with self._lock:
+            self._snapshot = await self._load(conn)
+        return self._snapshot
+
+
+product_catalog = ProductCatalog()
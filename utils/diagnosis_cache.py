@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from PIL import Image as PILImage
+
+DIAGNOSIS_CACHE_DIR = os.getenv("DIAGNOSIS_CACHE_DIR", os.path.join("cache", "diagnoses"))
+DIAGNOSIS_CACHE_TTL = int(os.getenv("DIAGNOSIS_CACHE_TTL", str(7 * 24 * 3600)))
+DIAGNOSIS_CACHE_MAX_ENTRIES = int(os.getenv("DIAGNOSIS_CACHE_MAX_ENTRIES", "1000"))
+DIAGNOSIS_CACHE_DISK_MAX_BYTES = int(os.getenv("DIAGNOSIS_CACHE_DISK_MAX_BYTES", str(100 * 1024 * 1024)))
+# Hamming distance (out of 64 bits) for near-duplicate matches; 0 disables perceptual matching
+DIAGNOSIS_CACHE_PHASH_DISTANCE = int(os.getenv("DIAGNOSIS_CACHE_PHASH_DISTANCE", "0"))
+
+
+def cache_key(image_bytes, prompt, model_name):
+    digest = hashlib.sha256()
+    for chunk in (model_name.encode(), b"\0", prompt.encode(), b"\0", image_bytes):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    """64-bit difference hash: stable across re-encoding, resizing and small edits."""
+    img = PILImage.open(BytesIO(image_bytes))
+    img.draft("L", (64, 64))
+    pixels = list(img.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+class DiagnosisCache:
+    def __init__(self, directory=DIAGNOSIS_CACHE_DIR, ttl=DIAGNOSIS_CACHE_TTL, max_entries=DIAGNOSIS_CACHE_MAX_ENTRIES,
+                 disk_max_bytes=DIAGNOSIS_CACHE_DISK_MAX_BYTES, phash_distance=DIAGNOSIS_CACHE_PHASH_DISTANCE):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.phash_distance = phash_distance
+        self._memory = OrderedDict()  # key -> (stored_at, text)
+        self._phashes = {}  # key -> (scope, phash)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # Seeded once; put() and expiry keep it current so writes never walk the directory
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key, stored_at, text):
+        with self._lock:
+            self._memory[key] = (stored_at, text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                evicted, _ = self._memory.popitem(last=False)
+                self._phashes.pop(evicted, None)
+                self.stats["evictions"] += 1
+
+    def _from_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._memory[key]
+                self._phashes.pop(key, None)
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _from_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            self._remove(self._path(key))
+            return None
+        self._remember(key, entry["stored_at"], entry["text"])
+        return entry["text"]
+
+    def _near(self, scope, phash):
+        with self._lock:
+            candidates = [(key, h) for key, (s, h) in self._phashes.items() if s == scope]
+        best = None
+        for key, candidate in candidates:
+            distance = bin(candidate ^ phash).count("1")
+            if distance <= self.phash_distance and (best is None or distance < best[1]):
+                best = (key, distance)
+        return self._from_memory(best[0]) if best else None
+
+    def get(self, image_bytes, prompt, model_name):
+        key = cache_key(image_bytes, prompt, model_name)
+        text = self._from_memory(key)
+        if text is not None:
+            self.stats["memory_hits"] += 1
+            return text
+        text = self._from_disk(key)
+        if text is not None:
+            self.stats["disk_hits"] += 1
+            return text
+        if self.phash_distance:
+            text = self._near(cache_key(b"", prompt, model_name), perceptual_hash(image_bytes))
+            if text is not None:
+                self.stats["near_hits"] += 1
+                return text
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, image_bytes, prompt, model_name, text):
+        key = cache_key(image_bytes, prompt, model_name)
+        stored_at = time.time()
+        self._remember(key, stored_at, text)
+        if self.phash_distance:
+            with self._lock:
+                self._phashes[key] = (cache_key(b"", prompt, model_name), perceptual_hash(image_bytes))
+        self.stats["stores"] += 1
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "text": text}, f)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += size - replaced
+                over = self._disk_bytes > self.disk_max_bytes
+            if over:
+                self._trim_disk()
+
+    def _disk_entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            self._disk_bytes -= size
+        return True
+
+    def _trim_disk(self):
+        # Only runs once the tracked size passes the cap; trims to 90% of it so the next few
+        # writes don't walk the directory again
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        with self._lock:
+            self._disk_bytes = total
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                self.stats["evictions"] += 1
+                total -= size
+
+    def snapshot(self):
+        data = dict(self.stats)
+        data["memory_entries"] = len(self._memory)
+        data["disk_bytes"] = self._disk_bytes
+        return data
+
+
+diagnosis_cache = DiagnosisCache()
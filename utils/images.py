@@ -0,0 +1,101 @@
+import os
+from io import BytesIO
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from PIL import Image as PILImage
+
+SCAN_MAX_UPLOAD_BYTES = int(os.getenv("SCAN_MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+SCAN_MAX_PIXELS = int(os.getenv("SCAN_MAX_PIXELS", str(40_000_000)))
+SCAN_MAX_SIDE = int(os.getenv("SCAN_MAX_SIDE", "1600"))  # longest side sent to the model
+SCAN_THUMB_SIDE = int(os.getenv("SCAN_THUMB_SIDE", "600"))  # 2in at 300dpi in the report
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """Caps POST bodies under `path_prefix` while they arrive, before Starlette has spooled the
+    multipart upload: a declared Content-Length over max_bytes gets 413 without reading the body,
+    and a chunked body is cut off with 413 as soon as it passes max_bytes."""
+
+    def __init__(self, app, max_bytes, path_prefix="/scans"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds {self.max_bytes // (1024 * 1024)} MB"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, which FastAPI passes on to its HTTPException handler
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file, max_bytes=SCAN_MAX_UPLOAD_BYTES):
+    """Copy an UploadFile into memory in chunks, rejecting it past max_bytes.
+
+    Starlette has already spooled the whole file by now; UploadLimitMiddleware is what bounds the
+    request while it is received, this enforces the per-file limit.
+    """
+    buffer = BytesIO()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"'{file.filename}' exceeds {max_bytes // (1024 * 1024)} MB")
+        buffer.write(chunk)
+    return buffer.getbuffer()
+
+
+def check_pixels(filename, content, max_pixels=SCAN_MAX_PIXELS):
+    """Reject (HTTP 413) an image whose header declares more than max_pixels; only the header is read.
+
+    Files PIL can't identify pass through and are skipped later as invalid images.
+    """
+    try:
+        img = PILImage.open(BytesIO(content))
+    except Exception:
+        return
+    if img.width * img.height > max_pixels:
+        raise HTTPException(status_code=413,
+                            detail=f"'{filename}' is {img.width}x{img.height}, above the {max_pixels} pixel limit")
+
+
+def preprocess_image(content, max_side=SCAN_MAX_SIDE, thumb_side=SCAN_THUMB_SIDE, max_pixels=SCAN_MAX_PIXELS):
+    """Decode once and return (model PNG bytes, report thumbnail JPEG bytes)."""
+    img = PILImage.open(BytesIO(content))
+    # Only the header has been read so far, so oversized images are rejected before decoding
+    if img.width * img.height > max_pixels:
+        raise ValueError(f"image is {img.width}x{img.height}, above the {max_pixels} pixel limit")
+
+    # For JPEGs, draft() lets the decoder downscale by 1/2..1/8 while decoding
+    img.draft("RGB", (max_side, max_side))
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), reducing_gap=2.0)
+
+    payload = BytesIO()
+    img.save(payload, format="PNG")
+
+    thumb = img.copy()
+    thumb.thumbnail((thumb_side, thumb_side), reducing_gap=2.0)
+    thumbnail = BytesIO()
+    thumb.save(thumbnail, format="JPEG", quality=85)
+
+    return payload.getvalue(), thumbnail.getvalue()
@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import span, run_in_context
+
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")  # "gemini" or "fake"
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+AI_RETRIES = int(os.getenv("AI_RETRIES", "2"))
+AI_BACKOFF = float(os.getenv("AI_BACKOFF", "0.5"))
+AI_BATCH = os.getenv("AI_BATCH", "0") == "1"
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))
+AI_BREAKER_RESET = float(os.getenv("AI_BREAKER_RESET", "30"))
+
+BATCH_INSTRUCTION = (
+    "Several images are attached. Analyse each image separately, in order, and begin the analysis "
+    "of image N with the line '--- Analysis for Image N ---'."
+)
+_BATCH_SPLIT = re.compile(r"^\s*-*\s*Analysis for Image\s+(\d+)\s*-*\s*$", re.MULTILINE | re.IGNORECASE)
+
+
+class InferenceUnavailable(Exception):
+    pass
+
+
+class GeminiBackend:
+    def __init__(self, model):
+        self.model = model
+        self.name = getattr(model, "model_name", "gemini")
+
+    def generate(self, parts):
+        with span("ai.generate_content"):
+            return self.model.generate_content(parts).text.strip()
+
+
+class FakeBackend:
+    """Offline stand-in with a fixed latency, for local runs and benchmarks."""
+
+    name = "fake"
+
+    def __init__(self, latency=None, text=None):
+        self.latency = float(os.getenv("AI_FAKE_LATENCY", "0.5")) if latency is None else latency
+        self.text = text or (
+            "Dental Condition Name\nGingivitis\n"
+            "Information About the Condition\nInflammation of the gums caused by plaque accumulation.\n"
+            "Severity Percentage\n40%\n"
+            "Home Cure or Remedy\nWarm salt water rinses twice daily.\n"
+            "Dietary Options or Food Solutions\nReduce sugary snacks and increase leafy greens.\n"
+            "Call for Action\nSchedule a routine dental consultation within two weeks.\n"
+        )
+
+    def generate(self, parts):
+        with span("ai.generate_content"):
+            time.sleep(self.latency)
+        images = sum(1 for part in parts if isinstance(part, dict))
+        if images <= 1:
+            return self.text
+        return "\n".join(f"--- Analysis for Image {i + 1} ---\n{self.text}" for i in range(images))
+
+
+def is_transient(error):
+    """Timeouts, connection errors, 429s and 5xxs: worth a retry, and counted by the breaker.
+
+    Anything else (a bad request, a ValueError from .text on a safety-blocked response) fails
+    the same way on every attempt and says nothing about the service's health.
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)  # google.api_core errors carry the HTTP status
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=AI_BREAKER_THRESHOLD, reset_after=AI_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_after:
+                return False
+            # Half-open: admit one trial call; another only if that one never reported back
+            if self.trial_started is not None and now - self.trial_started < self.reset_after:
+                return False
+            self.trial_started = now
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            self.trial_started = None
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+
+class InferenceClient:
+    def __init__(self, backend, concurrency=AI_CONCURRENCY, timeout=AI_TIMEOUT, retries=AI_RETRIES,
+                 backoff=AI_BACKOFF, batch=AI_BATCH, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.batch = batch
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inference")
+        self._semaphore = None
+        self._concurrency = concurrency
+
+    @property
+    def model_name(self):
+        return self.backend.name
+
+    def _finished(self, future):
+        # The permit is returned when the worker thread is done, not when the caller stops
+        # waiting, so calls that hang past the timeout still count against AI_CONCURRENCY
+        self._semaphore.release()
+        if not future.cancelled():
+            future.exception()  # retrieved, so an abandoned call doesn't log "never retrieved"
+
+    async def _generate(self, parts):
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, run_in_context(self.backend.generate), parts)
+        future.add_done_callback(self._finished)
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def _call(self, parts):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise InferenceUnavailable("AI service temporarily unavailable")
+            try:
+                text = await self._generate(parts)
+                self.breaker.record(True)
+                return text
+            except Exception as e:
+                last_error = e
+                if not is_transient(e):
+                    # The service answered; this input just can't be analysed
+                    self.breaker.record(True)
+                    break
+                self.breaker.record(False)
+                if attempt < self.retries:
+                    # Full jitter keeps simultaneous retries from hitting the API in lockstep
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        raise InferenceUnavailable(f"AI analysis failed: {last_error!r}")
+
+    async def analyze(self, prompt, image_parts):
+        """Return one analysis text per image, in upload order."""
+        if self.batch and len(image_parts) > 1:
+            text = await self._call([prompt, BATCH_INSTRUCTION, *image_parts])
+            return split_batch_response(text, len(image_parts))
+        return list(await asyncio.gather(*(self._call([prompt, part]) for part in image_parts)))
+
+
+def split_batch_response(text, count):
+    chunks = [""] * count
+    matches = list(_BATCH_SPLIT.finditer(text))
+    if not matches:
+        chunks[0] = text.strip()
+        return chunks
+    for i, match in enumerate(matches):
+        idx = int(match.group(1)) - 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        if 0 <= idx < count:
+            chunks[idx] = text[match.end():end].strip()
+    return chunks
+
+
+def build_inference_client(model):
+    backend = FakeBackend() if AI_BACKEND == "fake" else GeminiBackend(model)
+    return InferenceClient(backend)
@@ -0,0 +1,154 @@
+import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import run_in_context
+
+SCAN_JOB_MAX_PENDING = int(os.getenv("SCAN_JOB_MAX_PENDING", "50"))
+SCAN_JOB_PER_USER = int(os.getenv("SCAN_JOB_PER_USER", "2"))
+SCAN_JOB_RESULT_TTL = int(os.getenv("SCAN_JOB_RESULT_TTL", "3600"))
+SCAN_STAGE_WORKERS = {
+    "prepare": int(os.getenv("SCAN_PREPARE_WORKERS", "2")),
+    "render": int(os.getenv("SCAN_RENDER_WORKERS", "2")),
+    "convert": int(os.getenv("SCAN_CONVERT_WORKERS", "1")),
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class UserLimitExceeded(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, owner):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = "queued"  # queued -> running -> done | failed
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self.updated_at = time.time()
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, since, timeout):
+        """Return once the job moves past `since` or the timeout elapses (long-poll / SSE)."""
+        if self.version > since or self.finished:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "version": self.version,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class InProcessJobQueue:
+    """Job registry plus one bounded thread pool per pipeline stage, all inside the worker process.
+
+    Nothing is shared between processes: a job can only be polled on the worker that accepted it,
+    so job mode needs a single uvicorn worker or user-sticky routing (see the README).
+    """
+
+    def __init__(self, stage_workers=SCAN_STAGE_WORKERS, max_pending=SCAN_JOB_MAX_PENDING,
+                 per_user=SCAN_JOB_PER_USER, result_ttl=SCAN_JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.per_user = per_user
+        self.result_ttl = result_ttl
+        self._executors = {
+            stage: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"scan-{stage}")
+            for stage, workers in stage_workers.items()
+        }
+        self._jobs = {}
+        self._tasks = set()
+
+    def _active(self):
+        return [job for job in self._jobs.values() if not job.finished]
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, owner, pipeline, *args):
+        """Schedule `pipeline(job, *args)` and return its Job, or raise when over capacity."""
+        self._prune()
+        active = self._active()
+        if len(active) >= self.max_pending:
+            raise QueueFull()
+        if sum(1 for job in active if job.owner == owner) >= self.per_user:
+            raise UserLimitExceeded()
+
+        job = Job(owner)
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, pipeline, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job, pipeline, *args):
+        job.update(status="running")
+        try:
+            result = await pipeline(job, *args)
+            job.update(status="done", stage=None, result=result)
+        except Exception as e:
+            if not hasattr(e, "status_code"):
+                import traceback
+                traceback.print_exc()
+            job.update(status="failed", error=getattr(e, "detail", None) or str(e),
+                       error_status=getattr(e, "status_code", 500))
+
+    async def run_stage(self, job, stage, fn, *args):
+        """Run a blocking stage function on that stage's executor, recording progress on the job."""
+        job.update(stage=stage)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors[stage], run_in_context(fn), *args)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        active = self._active()
+        return {
+            "jobs": len(self._jobs),
+            "queued": sum(1 for j in active if j.status == "queued"),
+            "running": sum(1 for j in active if j.status == "running"),
+            "max_pending": self.max_pending,
+        }
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+scan_queue = InProcessJobQueue()
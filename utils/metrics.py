@@ -0,0 +1,218 @@
+# Request metrics and hot-path spans in Prometheus text format, without extra dependencies.
+# MetricsMiddleware times every request; `with span("db.query"):` times a step, feeding both a
+# per-span histogram and the current request's breakdown printed for slow requests.
+import os
+import time
+import bisect
+import threading
+import contextvars
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # when set, /metrics requires "Authorization: Bearer <token>"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))  # 0 disables the slow-request log
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# {span name: [count, seconds]} for the request being handled, None outside requests
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CollectedGauge:
+    """Gauge read from a callback at scrape time, e.g. a pool's current size."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def samples(self):
+        try:
+            return [f"{self.name} {self.read()}"]
+        except Exception:
+            return []
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+requests_total = register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")))
+request_duration = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")))
+requests_in_flight = register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("method",)))
+span_duration = register(Histogram(
+    "span_duration_seconds", "Time spent in instrumented steps (DB, bcrypt, AI, report rendering)", ("span",)))
+
+
+# ---------- Spans ----------
+
+class span:
+    """Time a block: `with span("db.query"): ...`. Cheap enough to leave on in every hot path."""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not METRICS_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self.started
+        span_duration.observe(elapsed, self.name)
+        spans = _request_spans.get()
+        if spans is not None:
+            entry = spans.get(self.name)
+            if entry is None:
+                spans[self.name] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+        return False
+
+
+def run_in_context(fn):
+    """Wrap fn for run_in_executor (which, unlike asyncio.to_thread, doesn't carry contextvars)
+    so spans inside it count towards the calling request."""
+    ctx = contextvars.copy_context()
+    return lambda *args: ctx.run(fn, *args)
+
+
+def format_spans(spans):
+    ranked = sorted(spans.items(), key=lambda item: item[1][1], reverse=True)
+    return ", ".join(f"{name} x{count} {seconds * 1000:.1f}ms" for name, (count, seconds) in ranked)
+
+
+# ---------- Middleware ----------
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware overhead) recording latency, status and spans."""
+
+    def __init__(self, app, slow_request_ms=SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        spans = {}
+        token = _request_spans.set(spans)
+        requests_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.dec(method)
+            _request_spans.reset(token)
+            # The router leaves the matched route in the scope; templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_duration.observe(elapsed, method, route)
+            requests_total.inc(method, route, str(status[0]))
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                print(f"[WARN] Slow request {method} {scope['path']} -> {status[0]} in {elapsed * 1000:.0f}ms"
+                      f" ({format_spans(spans) or 'no spans'})")
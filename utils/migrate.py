@@ -0,0 +1,154 @@
+# Versioned schema migrations: migrations/NNNN_name.sql, applied in order and recorded in
+# schema_migrations. Statements that hit something already there (a table, column or index
+# created by hand or from an older schemas.sql) are skipped, so any existing database can be
+# brought up to date. A statement preceded by a "-- mysql-only" comment is skipped on SQLite.
+# Usage: python -m utils.migrate [status | up [--to VERSION]]
+import os
+import re
+import sqlite3
+import argparse
+import mysql.connector
+from db import DB_BACKEND, get_connection
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "migrations"))
+
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_MYSQL_ALREADY_EXISTS = {1050, 1060, 1061}  # table exists, duplicate column, duplicate index name
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def statements(self, backend=DB_BACKEND):
+        with open(self.path) as f:
+            yield from split_statements(f.read(), backend)
+
+
+def split_statements(text, backend=DB_BACKEND):
+    """Statements end with ";" at the end of a line; full-line comments are dropped (they may
+    contain semicolons of their own)."""
+    lines, mysql_only = [], False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("--"):
+            mysql_only = mysql_only or stripped.startswith("-- mysql-only")
+            continue
+        if stripped:
+            lines.append(line)
+        if lines and stripped.endswith(";"):
+            sql = "\n".join(lines).strip().rstrip(";")
+            if backend != "sqlite":
+                yield sql
+            elif not mysql_only:
+                yield sqlite_ddl(sql)
+            lines, mysql_only = [], False
+    if lines:
+        raise ValueError(f"Statement without a closing semicolon: {lines[0].strip()}")
+
+
+def sqlite_ddl(ddl):
+    """Translate MySQL DDL to what the DB_BACKEND=sqlite stand-in expects."""
+    ddl = ddl.replace("INT PRIMARY KEY AUTO_INCREMENT", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    ddl = re.sub(r"UNIQUE KEY \w+ \(", "UNIQUE (", ddl)
+    return re.sub(r"ENUM\([^)]*\)", "TEXT", ddl)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _already_exists(error):
+    if isinstance(error, mysql.connector.Error):
+        return error.errno in _MYSQL_ALREADY_EXISTS
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("already exists" in message or "duplicate column" in message)
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return versions
+
+
+def pending(conn, migrations=None):
+    done = applied_versions(conn)
+    return [m for m in (migrations or load_migrations()) if m.version not in done]
+
+
+def migrate(conn, target=None, backend=DB_BACKEND, log=print):
+    """Apply every pending migration up to `target` (inclusive) and return the ones applied.
+
+    MySQL commits DDL implicitly, so a migration that fails halfway is not rolled back; fix the
+    cause and run again, the statements that already went through are skipped as existing.
+    """
+    cursor = conn.cursor()
+    if backend == "mysql":
+        # One runner at a time when several hosts deploy together
+        cursor.execute("SELECT GET_LOCK('schema_migrations', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Another migration run holds the schema_migrations lock")
+    try:
+        applied = []
+        for migration in pending(conn):
+            if target is not None and migration.version > target:
+                break
+            skipped = 0
+            for sql in migration.statements(backend):
+                try:
+                    cursor.execute(sql)
+                except Exception as e:
+                    if not _already_exists(e):
+                        conn.rollback()
+                        raise RuntimeError(f"Migration {migration.version:04d}_{migration.name} failed: {e}") from e
+                    skipped += 1
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                           (migration.version, migration.name))
+            conn.commit()
+            applied.append(migration)
+            note = f" ({skipped} statement(s) already applied)" if skipped else ""
+            log(f"Applied {migration.version:04d}_{migration.name}{note}")
+        return applied
+    finally:
+        if backend == "mysql":
+            cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+            cursor.fetchone()
+        cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.migrate")
+    parser.add_argument("command", choices=["status", "up"], nargs="?", default="up")
+    parser.add_argument("--to", type=int, help="stop after this version")
+    args = parser.parse_args()
+    conn = get_connection()
+    try:
+        if args.command == "status":
+            done = applied_versions(conn)
+            for migration in load_migrations():
+                print(f"{'applied' if migration.version in done else 'pending':<8} {migration.version:04d}_{migration.name}")
+        else:
+            applied = migrate(conn, args.to)
+            print(f"{len(applied)} migration(s) applied, {len(pending(conn))} pending")
+    finally:
+        conn.close()
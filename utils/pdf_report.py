@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import subprocess
+from io import BytesIO
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from jinja2 import Environment
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph as PDFParagraph, Spacer, Image, Table as PDFTable, TableStyle
+from reportlab.lib import colors
+
+REPORT_CONVERTER_WORKERS = int(os.getenv("REPORT_CONVERTER_WORKERS", "1"))
+SOFFICE_BINARY = os.getenv("SOFFICE_BINARY", "soffice")
+
+_IMAGE_VAR = re.compile(r"\{\{\s*image_\d+\s*\}\}")
+# Tables span the template's 6.7in text width; the first column holds the labels
+_TABLE_WIDTH = 6.7 * inch
+_LABEL_WIDTH = 1.8 * inch
+_jinja = Environment(autoescape=False)
+
+
+def _pdf_text(text):
+    # Built-in PDF fonts only cover cp1252, so drop emoji and other glyphs they cannot draw
+    text = text.encode("cp1252", "ignore").decode("cp1252")
+    return escape(text.strip()).replace("\n", "<br/>")
+
+
+class NativeReportTemplate:
+    """The DOCX report template, parsed once into blocks that render straight to PDF."""
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks = []
+        document = Document(path)
+        for element in document.element.body.iterchildren():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "p":
+                paragraph = Paragraph(element, document)
+                text = paragraph.text
+                if _IMAGE_VAR.search(text):
+                    self.blocks.append(("images", None))
+                elif text.strip():
+                    self.blocks.append(("paragraph", (paragraph.style.name, _jinja.from_string(text))))
+                elif self.blocks and self.blocks[-1][0] != "spacer":
+                    self.blocks.append(("spacer", None))
+            elif tag == "tbl":
+                rows = [[_jinja.from_string(cell.text) for cell in row.cells] for row in Table(element, document).rows]
+                self.blocks.append(("table", rows))
+
+        base = getSampleStyleSheet()
+        self.styles = {
+            "Title": ParagraphStyle("ReportTitle", parent=base["Title"], fontSize=20),
+            "Heading 1": ParagraphStyle("ReportHeading", parent=base["Heading3"], spaceBefore=4, spaceAfter=2),
+            "Body": ParagraphStyle("ReportBody", parent=base["BodyText"], fontSize=10, leading=13),
+        }
+
+    def render(self, context, thumbnails):
+        """Return the finished report as PDF bytes."""
+        story = []
+        for kind, data in self.blocks:
+            if kind == "spacer":
+                story.append(Spacer(1, 6))
+            elif kind == "paragraph":
+                style_name, template = data
+                text = template.render(context)
+                if text.strip():
+                    style = self.styles.get(style_name, self.styles["Body"])
+                    story.append(PDFParagraph(_pdf_text(text), style))
+            elif kind == "table":
+                columns = max(len(row) for row in data)
+                rows = [[PDFParagraph(_pdf_text(cell.render(context)), self.styles["Body"]) for cell in row]
+                        + [""] * (columns - len(row)) for row in data]
+                table = PDFTable(rows, colWidths=_column_widths(columns))
+                table.setStyle(TableStyle([
+                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ]))
+                story.append(table)
+            elif kind == "images" and thumbnails:
+                cells = []
+                for thumbnail in thumbnails:
+                    image = Image(BytesIO(thumbnail))
+                    scale = 1.3 * inch / max(image.imageWidth, image.imageHeight)
+                    image.drawWidth = image.imageWidth * scale
+                    image.drawHeight = image.imageHeight * scale
+                    cells.append(image)
+                story.append(PDFTable([cells]))
+
+        output = BytesIO()
+        doc = SimpleDocTemplate(output, pagesize=A4, leftMargin=0.6 * inch, rightMargin=0.6 * inch,
+                                topMargin=0.6 * inch, bottomMargin=0.6 * inch, title="AI Based Dental Scan Report")
+        doc.build(story)
+        return output.getvalue()
+
+
+def _column_widths(columns):
+    if columns == 1:
+        return [_TABLE_WIDTH]
+    return [_LABEL_WIDTH] + [(_TABLE_WIDTH - _LABEL_WIDTH) / (columns - 1)] * (columns - 1)
+
+
+# ---------- DOCX -> PDF route ----------
+# Kept for pixel-identical Word output. Conversions run in long-lived worker processes, which
+# bounds how many run at once and lets each worker reuse one LibreOffice user profile (created on
+# its first report) instead of building a fresh one per call. The office process itself is not
+# kept warm: every report still launches soffice (or Word, via docx2pdf) once.
+
+def _convert_in_worker(docx_path, pdf_path):
+    if sys.platform in ("win32", "darwin"):
+        from docx2pdf import convert
+        convert(docx_path, pdf_path)
+        return
+    profile = os.path.join(tempfile.gettempdir(), f"intellident-soffice-{os.getpid()}")
+    subprocess.run([
+        SOFFICE_BINARY, f"-env:UserInstallation=file://{profile}", "--headless", "--norestore",
+        "--convert-to", "pdf", "--outdir", os.path.dirname(os.path.abspath(pdf_path)), docx_path,
+    ], check=True, timeout=120, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    produced = os.path.splitext(os.path.abspath(docx_path))[0] + ".pdf"
+    if produced != os.path.abspath(pdf_path):
+        os.replace(produced, pdf_path)
+
+
+_converter_pool = None
+_converter_lock = threading.Lock()
+
+
+def convert_docx(docx_path, pdf_path):
+    global _converter_pool
+    if _converter_pool is None:
+        with _converter_lock:
+            if _converter_pool is None:
+                _converter_pool = ProcessPoolExecutor(max_workers=REPORT_CONVERTER_WORKERS)
+    _converter_pool.submit(_convert_in_worker, docx_path, pdf_path).result()
+
+
+def shutdown_converter():
+    if _converter_pool is not None:
+        _converter_pool.shutdown(wait=False, cancel_futures=True)
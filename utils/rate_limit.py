@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+LOGIN_RATE_PER_IP = float(os.getenv("LOGIN_RATE_PER_IP", "30"))  # attempts per minute
+LOGIN_BURST_PER_IP = float(os.getenv("LOGIN_BURST_PER_IP", "10"))
+LOGIN_RATE_PER_ACCOUNT = float(os.getenv("LOGIN_RATE_PER_ACCOUNT", "5"))
+LOGIN_BURST_PER_ACCOUNT = float(os.getenv("LOGIN_BURST_PER_ACCOUNT", "20"))
+LOGIN_RATE_PER_ACCOUNT_IP = float(os.getenv("LOGIN_RATE_PER_ACCOUNT_IP", "5"))
+LOGIN_BURST_PER_ACCOUNT_IP = float(os.getenv("LOGIN_BURST_PER_ACCOUNT_IP", "5"))
+REGISTER_RATE_PER_IP = float(os.getenv("REGISTER_RATE_PER_IP", "10"))
+REGISTER_BURST_PER_IP = float(os.getenv("REGISTER_BURST_PER_IP", "5"))
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets per key; the least recently seen keys are dropped past max_keys."""
+
+    def __init__(self, rate_per_minute, burst, max_keys=100_000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take one token for `key`; returns 0 when allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed = True
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed = False
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return 0
+        return (1 - tokens) / self.rate if self.rate else 60
+
+    def reset(self, key):
+        """Refill `key`'s bucket, e.g. after a successful login."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+def client_ip(request):
+    # The peer address; behind a reverse proxy run uvicorn with --proxy-headers and
+    # --forwarded-allow-ips=<proxy> so this is the real client, not the proxy
+    return request.client.host if request.client else ""
+
+
+login_ip_limiter = TokenBucketLimiter(LOGIN_RATE_PER_IP, LOGIN_BURST_PER_IP)
+# Keyed on the account alone: caps bcrypt work per account however many addresses the guesses come
+# from. The larger burst and the refill on a successful login keep the owner from being locked out
+# by a short run of failures.
+login_account_limiter = TokenBucketLimiter(LOGIN_RATE_PER_ACCOUNT, LOGIN_BURST_PER_ACCOUNT)
+# Keyed on (account, IP): one address hammering an account runs dry well before the shared bucket does
+login_account_ip_limiter = TokenBucketLimiter(LOGIN_RATE_PER_ACCOUNT_IP, LOGIN_BURST_PER_ACCOUNT_IP)
+register_ip_limiter = TokenBucketLimiter(REGISTER_RATE_PER_IP, REGISTER_BURST_PER_IP)
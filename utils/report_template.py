@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+from io import BytesIO
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+REPORT_TEMPLATE_CHECK_INTERVAL = float(os.getenv("REPORT_TEMPLATE_CHECK_INTERVAL", "2"))
+
+
+class _CompiledCacheEnvironment(Environment):
+    """Jinja environment that compiles each distinct XML source only once."""
+
+    def __init__(self):
+        super().__init__()
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        template = self._compiled.get(source)
+        if template is None:
+            template = super().from_string(source, globals, template_class)
+            self._compiled[source] = template
+        return template
+
+
+class _PreparedDocxTemplate(DocxTemplate):
+    def __init__(self, compiled):
+        super().__init__(BytesIO(compiled.source))
+        self._compiled = compiled
+
+    def build_xml(self, context, jinja_env=None):
+        # Skip get_xml()/patch_xml(): the body was serialized and patched when the template was loaded
+        return self.render_xml_part(self._compiled.patched_body, self.docx._part, context, jinja_env)
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        super().render(context, jinja_env or self._compiled.jinja_env, autoescape)
+
+
+class CompiledDocxTemplate:
+    """A DOCX template read, patched and Jinja-compiled once; new() hands out cheap per-request copies."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.source = f.read()
+        probe = DocxTemplate(BytesIO(self.source))
+        probe.init_docx()
+        self.patched_body = probe.patch_xml(probe.get_xml())
+        self.jinja_env = _CompiledCacheEnvironment()
+        # Warm the compile cache so the first request doesn't pay for it
+        probe = self.new()
+        probe.render({})
+
+    def new(self):
+        return _PreparedDocxTemplate(self)
+
+
+class ReloadingTemplate:
+    """Keeps one parsed template per worker and reloads it when the file's mtime changes."""
+
+    def __init__(self, path, loader, check_interval=REPORT_TEMPLATE_CHECK_INTERVAL):
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns
+        self._template = loader(path)
+        self._checked_at = time.monotonic()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    mtime = os.stat(self.path).st_mtime_ns
+                    if mtime != self._mtime:
+                        self._template = self.loader(self.path)
+                        self._mtime = mtime
+        return self._template
@@ -0,0 +1,86 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Response
+from utils.serialization import dumps
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))  # bounds staleness across workers
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+
+class CachedBody:
+    def __init__(self, body, headers=None):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.headers = headers or {}
+        self.stored_at = time.monotonic()
+
+
+class ResponseCache:
+    """Serialized JSON responses keyed by query; clear() is called by the handlers that write the data."""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    async def get_or_build(self, key, build):
+        """Return the CachedBody for key, awaiting build() -> (payload, headers) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        payload, headers = await build()
+        entry = CachedBody(dumps(payload), headers)
+        with self._lock:
+            # Don't store a body built from data that was invalidated while we were querying
+            if generation == self._generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.stats["invalidations"] += 1
+
+
+def _matches(request, etag):
+    candidates = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    return etag in candidates or "*" in candidates
+
+
+def _cache_headers(etag, max_age, extra=None):
+    headers = dict(extra or {})
+    headers["ETag"] = etag
+    headers["Cache-Control"] = f"public, max-age={max_age}" if max_age else "no-cache"
+    return headers
+
+
+def cached_json_response(entry, request, max_age=0):
+    headers = _cache_headers(entry.etag, max_age, entry.headers)
+    if _matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def conditional_json_response(request, etag, build, max_age=0):
+    """Answer 304 when the client already has `etag`; only otherwise call build() for the payload."""
+    headers = _cache_headers(etag, max_age)
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = dumps(build())
+    return Response(content=body, media_type="application/json", headers=headers)
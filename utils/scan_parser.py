@@ -0,0 +1,176 @@
+import re
+import json
+from schemas import ImageFindings, ScanFindings
+
+# Canonical field -> heading as the prompt asks for it, followed by variants the model also produces
+SECTION_HEADINGS = {
+    "condition": ("Dental Condition Name", "Condition Name", "Dental Condition", "Condition", "Diagnosis"),
+    "information": ("Information About the Condition", "Information About Condition", "About the Condition",
+                    "Condition Information", "Information", "Explanation"),
+    "severity": ("Severity Percentage", "Severity Level", "Severity"),
+    "remedy": ("Home Cure or Remedy", "Home Cure and Remedy", "Home Remedies", "Home Remedy", "Home Cure", "Remedy"),
+    "diet": ("Dietary Options or Food Solutions", "Dietary Options", "Dietary Recommendations", "Food Solutions",
+             "Diet"),
+    "action": ("Call for Action", "Call to Action", "Recommended Action", "Next Steps", "Action"),
+}
+
+_HEADING_FIELDS = {}
+for _field, _variants in SECTION_HEADINGS.items():
+    for _variant in _variants:
+        _HEADING_FIELDS[" ".join(_variant.lower().split())] = _field
+
+# Single-word variants ("Diagnosis", "Diet", "Action", ...) only open a section on a line of their
+# own: prose such as "Diet: keep to soft foods" would otherwise cut the previous section short.
+# "Severity: 70%" is the one short form models reliably write inline.
+_INLINE_SHORT_HEADINGS = {"severity"}
+
+# Fast path for output that follows the prompt exactly: the canonical headings as whole lines
+_CANONICAL_LINES = {variants[0]: field for field, variants in SECTION_HEADINGS.items()}
+
+# A heading line: optional numbering / markdown decoration and one of the known headings, either
+# alone on the line or followed by a colon/dash and the section's content ("Severity Percentage: 70%").
+# Requiring the separator keeps prose such as "Diet plays a role..." from reading as a heading.
+_HEADING = re.compile(
+    r"^[ \t#>*_\-]*(?:(?:\d{1,2}|[a-f])[.)][ \t]*)?[*_]*[ \t]*(?P<name>"
+    + "|".join(sorted((re.escape(v).replace(r"\ ", r"[ \t]+") for v in _HEADING_FIELDS), key=len, reverse=True))
+    + r")[ \t]*[*_]*[ \t]*(?:\([^)\n]*\))?[ \t]*(?:[:\-–][ \t]*[*_]*[ \t]*(?P<rest>.*)|[*_:]*[ \t]*)\r?$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SEVERITY = re.compile(r"(\d{1,3}(?:\.\d+)?)\s*(?:%|percent|per\s*cent)", re.IGNORECASE)
+_NUMBER = re.compile(r"\d{1,3}(?:\.\d+)?")
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+# For SCAN_RESPONSE_FORMAT=json: the model is asked for an object with exactly these keys
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "condition": {"type": "string"},
+        "information": {"type": "string"},
+        "severity": {"type": "integer", "minimum": 0, "maximum": 100},
+        "remedy": {"type": "string"},
+        "diet": {"type": "string"},
+        "action": {"type": "string"},
+    },
+    "required": ["condition", "information", "severity", "remedy", "diet", "action"],
+}
+JSON_RESPONSE_INSTRUCTIONS = (
+    "\nReturn only a JSON object, without markdown fences or any other text, that matches this JSON schema: "
+    + json.dumps(RESPONSE_SCHEMA)
+    + ". Put the content of each heading above in the matching field; severity is the percentage as an integer."
+)
+
+
+def parse_severity(text):
+    """Integer 0-100 from text such as "72%", "Approximately 72 percent" or "Severity: 72"."""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return max(0, min(100, round(text)))
+    match = _SEVERITY.search(text)
+    if match:
+        value = match.group(1)
+    else:
+        # A bare number only counts when it's the only one ("Severity: 72", not "1 to 10, 7")
+        numbers = _NUMBER.findall(text)
+        if len(numbers) != 1:
+            return None
+        value = numbers[0]
+    return max(0, min(100, round(float(value))))
+
+
+def _clean(text):
+    return " ".join(text.replace("**", "").split())
+
+
+def _parse_json(text):
+    stripped = text.strip()
+    fenced = _JSON_FENCE.match(stripped)
+    if fenced:
+        stripped = fenced.group(1)
+    if not stripped.startswith("{"):
+        return None
+    try:
+        data = json.loads(stripped)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    fields = {field: _clean(str(data.get(field) or "")) for field in SECTION_HEADINGS if field != "severity"}
+    return ImageFindings(severity=parse_severity(data.get("severity")), **fields)
+
+
+def _canonical_sections(text):
+    """Sections by whole-line lookup, for output that puts every canonical heading on a line of its
+    own as the prompt asks. Then only those lines are headings, so the variants (and their regex)
+    never come into play; None for any other layout."""
+    sections = {}
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        field = _CANONICAL_LINES.get(line)
+        if field:
+            current = sections.setdefault(field, [])
+        elif current is not None and line:
+            current.append(line)
+    if len(sections) != len(SECTION_HEADINGS):
+        return None
+    return {field: " ".join(lines) for field, lines in sections.items()}
+
+
+def _heading_sections(text):
+    # One scan over the whole text finds every heading line; a section's content runs from the
+    # end of its heading to the start of the next one (a repeated heading appends)
+    sections = dict.fromkeys(SECTION_HEADINGS, "")
+    headings = []
+    for heading in _HEADING.finditer(text):
+        name = " ".join(heading.group("name").lower().split())
+        if heading.group("rest") and " " not in name and name not in _INLINE_SHORT_HEADINGS:
+            continue
+        headings.append((heading, _HEADING_FIELDS[name]))
+    for i, (heading, field) in enumerate(headings):
+        end = headings[i + 1][0].start() if i + 1 < len(headings) else len(text)
+        sections[field] += f" {heading.group('rest') or ''} {text[heading.end():end]}"
+    return sections
+
+
+def parse_image_output(text):
+    """Parse one image's model output (structured JSON or headed text) in a single pass."""
+    findings = _parse_json(text)
+    if findings is not None:
+        return findings
+
+    sections = _canonical_sections(text)
+    if sections is None:
+        sections = _heading_sections(text)
+
+    fields = {field: _clean(content) for field, content in sections.items()}
+    severity_text = fields.pop("severity")
+    return ImageFindings(severity=parse_severity(severity_text), **fields)
+
+
+def _combine(values):
+    distinct = list(dict.fromkeys(v for v in values if v))
+    if len(distinct) <= 1:
+        return distinct[0] if distinct else ""
+    return "\n".join(f"Image {i + 1}: {v}" for i, v in enumerate(values) if v)
+
+
+def aggregate(images):
+    """Combine per-image findings: most severe first for the headline, every image's details kept."""
+    severities = [image.severity for image in images if image.severity is not None]
+    ranked = sorted(images, key=lambda image: image.severity if image.severity is not None else -1, reverse=True)
+    conditions = list(dict.fromkeys(image.condition for image in ranked if image.condition))
+    return ScanFindings(
+        images=images,
+        condition="; ".join(conditions),
+        severity=max(severities) if severities else None,
+        information=_combine([image.information for image in images]),
+        remedy=_combine([image.remedy for image in images]),
+        diet=_combine([image.diet for image in images]),
+        action=ranked[0].action if ranked else "",
+    )
+
+
+def parse_scan(texts):
+    """Per-image model outputs -> ScanFindings with typed per-image results and the aggregate."""
+    return aggregate([parse_image_output(text) for text in texts])
@@ -0,0 +1,269 @@
+import os
+import re
+import math
+import time
+import bisect
+import heapq
+import asyncio
+import threading
+from collections import defaultdict
+from db import async_connection
+
+SEARCH_REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "300"))  # full rebuild, picks up other workers' writes
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+SEARCH_PREFIX_MIN = 2  # shortest query term expanded as a prefix
+SEARCH_TYPO_MIN = 4  # shortest query term allowed one typo
+PREFIX_PENALTY = 0.8
+TYPO_PENALTY = 0.6
+
+_TOKEN = re.compile(r"\w+")
+
+# (field, weight): a hit in a name counts more than one buried in a description
+PRODUCT_FIELDS = (("name", 3.0), ("category", 2.0), ("description", 1.0))
+DOCTOR_FIELDS = (("first_name", 3.0), ("last_name", 3.0), ("specialty", 2.0), ("city", 2.0), ("languages", 1.0), ("short_bio", 1.0))
+PRODUCT_SUMMARY = ("id", "name", "price", "image_url", "category")
+DOCTOR_SUMMARY = ("id", "first_name", "last_name", "specialty", "city", "rating", "profile_image")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """Levenshtein distance <= 1, also accepting one adjacent transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking, prefix expansion and single-typo tolerance."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs = {}  # (kind, id) -> (summary, {term: weighted tf}, length)
+        self.postings = defaultdict(dict)  # term -> {(kind, id): weighted tf}
+        self.vocabulary = []  # sorted, for prefix lookups
+        self.typo_map = defaultdict(set)  # term with one char deleted -> terms
+        self.total_length = 0.0
+
+    def _add_term(self, term):
+        bisect.insort(self.vocabulary, term)
+        if len(term) >= SEARCH_TYPO_MIN:
+            for variant in _deletes(term):
+                self.typo_map[variant].add(term)
+
+    def _drop_term(self, term):
+        del self.postings[term]
+        i = bisect.bisect_left(self.vocabulary, term)
+        if i < len(self.vocabulary) and self.vocabulary[i] == term:
+            del self.vocabulary[i]
+        if len(term) >= SEARCH_TYPO_MIN:
+            for variant in _deletes(term):
+                terms = self.typo_map.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self.typo_map[variant]
+
+    def upsert(self, kind, doc_id, row, fields, summary_fields):
+        key = (kind, doc_id)
+        weights = defaultdict(float)
+        for field, weight in fields:
+            for term in tokenize(str(row.get(field) or "")):
+                weights[term] += weight
+        length = sum(weights.values())
+        summary = {f: row.get(f) for f in summary_fields}
+        summary["id"] = doc_id
+        with self._lock:
+            self._remove(key)
+            self.docs[key] = (summary, weights, length)
+            self.total_length += length
+            for term, tf in weights.items():
+                if term not in self.postings:
+                    self._add_term(term)
+                self.postings[term][key] = tf
+
+    def _remove(self, key):
+        entry = self.docs.pop(key, None)
+        if entry is None:
+            return
+        _, weights, length = entry
+        self.total_length -= length
+        for term in weights:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    self._drop_term(term)
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            self._remove((kind, doc_id))
+
+    def _expand(self, term, allow_prefix):
+        """Map index terms matching a query term to a score multiplier."""
+        matches = {}
+        if term in self.postings:
+            matches[term] = 1.0
+        if allow_prefix and len(term) >= SEARCH_PREFIX_MIN:
+            i = bisect.bisect_left(self.vocabulary, term)
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+                matches.setdefault(self.vocabulary[i], PREFIX_PENALTY)
+                i += 1
+        if len(term) >= SEARCH_TYPO_MIN:
+            candidates = set(self.typo_map.get(term, ()))
+            for variant in _deletes(term):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates |= self.typo_map.get(variant, set())
+            for candidate in candidates:
+                if candidate not in matches and _within_one_edit(term, candidate):
+                    matches[candidate] = TYPO_PENALTY
+        return matches
+
+    def search(self, query, kinds=None, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self.docs)
+            if not n_docs:
+                return []
+            avg_length = self.total_length / n_docs or 1.0
+            base = SEARCH_BM25_K1 * (1 - SEARCH_BM25_B)
+            per_length = SEARCH_BM25_K1 * SEARCH_BM25_B / avg_length
+
+            # Every query term must match (exactly, as a prefix, or with one typo); the last term
+            # is treated as a prefix since it's usually still being typed
+            expanded = []
+            for position, term in enumerate(terms):
+                matches = self._expand(term, allow_prefix=position == len(terms) - 1)
+                if not matches:
+                    return []
+                postings = [(self.postings[t], multiplier) for t, multiplier in matches.items()]
+                expanded.append((sum(len(p) for p, _ in postings), postings))
+            # Rarest term first so later terms only score the surviving candidates
+            expanded.sort(key=lambda item: item[0])
+
+            scores = None
+            for _, postings in expanded:
+                term_scores = {}
+                for posting, multiplier in postings:
+                    idf = multiplier * math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    keys = posting if scores is None else (k for k in scores if k in posting)
+                    for key in keys:
+                        if kinds and key[0] not in kinds:
+                            continue
+                        tf = posting[key]
+                        score = idf * tf * (SEARCH_BM25_K1 + 1) / (tf + base + per_length * self.docs[key][2])
+                        if score > term_scores.get(key, 0.0):
+                            term_scores[key] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: s + term_scores[key] for key, s in scores.items() if key in term_scores}
+                if not scores:
+                    return []
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [
+                {"type": key[0], "id": key[1], "score": round(score, 4), "item": dict(self.docs[key][0])}
+                for key, score in ranked
+            ]
+
+    def __len__(self):
+        return len(self.docs)
+
+
+class CatalogSearch:
+    """The products + doctors index, loaded lazily and kept current by the admin CRUD handlers."""
+
+    def __init__(self, refresh_interval=SEARCH_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._pending = None  # admin changes made while a rebuild is in flight, replayed onto the new index
+
+    @staticmethod
+    def index_rows(products, doctors):
+        index = SearchIndex()
+        for row in products:
+            row["price"] = float(row["price"]) if row["price"] is not None else None
+            index.upsert("product", row["id"], row, PRODUCT_FIELDS, PRODUCT_SUMMARY)
+        for row in doctors:
+            index.upsert("doctor", row["id"], row, DOCTOR_FIELDS, DOCTOR_SUMMARY)
+        return index
+
+    @classmethod
+    async def build(cls, conn):
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute("SELECT id, name, description, image_url, price, category FROM products")
+        products = await cursor.fetchall()
+        await cursor.execute("""
+            SELECT id, first_name, last_name, short_bio, specialty, languages, city, rating, profile_image
+            FROM doctors
+        """)
+        doctors = await cursor.fetchall()
+        await cursor.close()
+        # Tokenizing every row is CPU work; keep it off the event loop
+        return await asyncio.to_thread(cls.index_rows, products, doctors)
+
+    def _stale(self):
+        return self._index is None or time.monotonic() - self._loaded_at > self.refresh_interval
+
+    async def get(self):
+        """The index, borrowing a connection only when it has to be (re)built."""
+        if self._stale():
+            async with self._lock:
+                if self._stale():
+                    self._pending = []
+                    try:
+                        async with async_connection() as conn:
+                            index = await self.build(conn)
+                        # The build's SELECTs may predate writes made since; replaying them is
+                        # harmless when they don't (upsert and remove are idempotent)
+                        for change in self._pending:
+                            change(index)
+                    finally:
+                        self._pending = None
+                    self._index = index
+                    self._loaded_at = time.monotonic()
+        return self._index
+
+    def _apply(self, change):
+        if self._index is not None:
+            change(self._index)
+        if self._pending is not None:
+            self._pending.append(change)
+
+    def upsert_product(self, product_id, row):
+        row = dict(row, price=float(row["price"]) if row.get("price") is not None else None)
+        self._apply(lambda index: index.upsert("product", product_id, row, PRODUCT_FIELDS, PRODUCT_SUMMARY))
+
+    def upsert_doctor(self, doctor_id, row):
+        row = dict(row)
+        self._apply(lambda index: index.upsert("doctor", doctor_id, row, DOCTOR_FIELDS, DOCTOR_SUMMARY))
+
+    def remove(self, kind, doc_id):
+        self._apply(lambda index: index.remove(kind, doc_id))
+
+
+catalog_search = CatalogSearch()
@@ -0,0 +1,45 @@
+# JSON encoding for the responses the app serializes itself (response caches, conditional GETs,
+# ad-hoc JSONResponses). Uses orjson when installed, stdlib json otherwise; either way values are
+# encoded in one pass instead of jsonable_encoder's recursive copy. Routes with a response_model
+# don't come through here: FastAPI dumps those straight to bytes with pydantic-core.
+import json
+from enum import Enum
+from decimal import Decimal
+from datetime import date, datetime, time
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # Same output as jsonable_encoder for the types rows and models carry
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(payload):
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(payload):
+        return json.dumps(payload, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
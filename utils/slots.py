@@ -0,0 +1,81 @@
+import os
+import bisect
+from datetime import datetime, timedelta, time
+
+# Used for doctors with no rows in doctor_working_hours: "start-end" on the given weekdays (0 = Monday)
+APPOINTMENT_DEFAULT_HOURS = os.getenv("APPOINTMENT_DEFAULT_HOURS", "09:00-17:00")
+APPOINTMENT_DEFAULT_DAYS = os.getenv("APPOINTMENT_DEFAULT_DAYS", "0,1,2,3,4,5")
+APPOINTMENT_SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "30"))
+AVAILABILITY_MAX_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "31"))
+
+
+class WorkingWindow:
+    def __init__(self, weekday, start_minute, end_minute, slot_minutes):
+        self.weekday = int(weekday)
+        self.start_minute = int(start_minute)
+        self.end_minute = int(end_minute)
+        self.slot_minutes = int(slot_minutes)
+
+    def slots(self, day):
+        midnight = datetime.combine(day, time())
+        minute = self.start_minute
+        while minute + self.slot_minutes <= self.end_minute:
+            yield midnight + timedelta(minutes=minute)
+            minute += self.slot_minutes
+
+
+def parse_hhmm(value):
+    hours, minutes = value.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def default_windows():
+    start, end = APPOINTMENT_DEFAULT_HOURS.split("-")
+    return [WorkingWindow(day, parse_hhmm(start), parse_hhmm(end), APPOINTMENT_SLOT_MINUTES)
+            for day in APPOINTMENT_DEFAULT_DAYS.split(",") if day.strip()]
+
+
+def to_datetime(value):
+    # MySQL hands back datetime objects, the SQLite stand-in ISO strings
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def window_for(windows, when):
+    """The working window offering a slot that starts exactly at `when`, if any."""
+    minute = when.hour * 60 + when.minute
+    if when.second or when.microsecond:
+        return None
+    for window in windows:
+        if (window.weekday == when.weekday() and window.start_minute <= minute
+                and minute + window.slot_minutes <= window.end_minute
+                and (minute - window.start_minute) % window.slot_minutes == 0):
+            return window
+    return None
+
+
+def overlaps(booked, slot, length):
+    """Whether a slot of `length` starting at `slot` overlaps a booking in sorted `booked`. Bookings
+    are taken to run one current slot length, so any start within `length` either side collides."""
+    i = bisect.bisect_right(booked, slot - length)
+    return i < len(booked) and booked[i] < slot + length
+
+
+def open_slots(windows, booked, start_date, end_date, now=None):
+    """Slot start times between start_date and end_date (inclusive) not overlapping any booking."""
+    now = now or datetime.now()
+    booked = sorted(booked)
+    free = []
+    day = start_date
+    while day <= end_date:
+        for window in windows:
+            if window.weekday != day.weekday():
+                continue
+            length = timedelta(minutes=window.slot_minutes)
+            for slot in window.slots(day):
+                if slot <= now:
+                    continue
+                if overlaps(booked, slot, length):
+                    continue
+                free.append(slot)
+        day += timedelta(days=1)
+    return sorted(free)
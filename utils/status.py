@@ -0,0 +1,59 @@
+from fastapi import HTTPException
+
+# Allowed next states; anything not listed (e.g. delivered -> pending) is rejected by the bulk endpoints.
+# The keys are the valid statuses for every status endpoint, single-id ones included.
+ORDER_TRANSITIONS = {
+    "pending": {"paid", "confirmed", "shipped", "cancelled"},
+    "paid": {"confirmed", "shipped", "cancelled"},
+    "confirmed": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
+APPOINTMENT_TRANSITIONS = {
+    "pending": {"confirmed", "cancelled"},
+    "confirmed": {"completed", "cancelled"},
+    "completed": set(),
+    "cancelled": set(),
+}
+
+
+async def bulk_transition(conn, table, transitions, ids, status, extra_set="", columns=(), on_updated=None):
+    """Move every id in `ids` to `status` where the state machine allows it, in one transaction.
+
+    The caller wraps this in db.async_transaction(); rows are locked, checked, then updated with
+    a single UPDATE. `on_updated` is called with the locked rows (id, status and `columns`) that changed.
+    Returns one result per requested id.
+    """
+    if status not in transitions:
+        raise HTTPException(status_code=400, detail="Invalid status")
+    ids = list(dict.fromkeys(ids))
+
+    cursor = await conn.cursor(dictionary=True)
+    placeholders = ", ".join(["%s"] * len(ids))
+    selected = ", ".join(("id", "status", *columns))
+    await cursor.execute(f"SELECT {selected} FROM {table} WHERE id IN ({placeholders}) FOR UPDATE", tuple(ids))
+    rows = {row["id"]: row for row in await cursor.fetchall()}
+    current = {item_id: row["status"] for item_id, row in rows.items()}
+
+    results, allowed = [], []
+    for item_id in ids:
+        previous = current.get(item_id)
+        if previous is None:
+            results.append({"id": item_id, "result": "not_found"})
+        elif previous == status:
+            results.append({"id": item_id, "result": "unchanged", "from": previous})
+        elif status not in transitions.get(previous, ()):
+            results.append({"id": item_id, "result": "invalid_transition", "from": previous})
+        else:
+            results.append({"id": item_id, "result": "updated", "from": previous})
+            allowed.append(item_id)
+
+    if allowed:
+        placeholders = ", ".join(["%s"] * len(allowed))
+        await cursor.execute(f"UPDATE {table} SET status = %s{extra_set} WHERE id IN ({placeholders})", (status, *allowed))
+        if on_updated:
+            on_updated([rows[item_id] for item_id in allowed])
+    await cursor.close()
+    return {"status": status, "updated": len(allowed), "results": results}
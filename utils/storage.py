@@ -0,0 +1,219 @@
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from config import SECRET_KEY
+
+REPORT_STORAGE = os.getenv("REPORT_STORAGE", "local")  # "local" or "s3"
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+REPORT_S3_BUCKET = os.getenv("REPORT_S3_BUCKET")
+REPORT_S3_ENDPOINT_URL = os.getenv("REPORT_S3_ENDPOINT_URL")  # e.g. a local MinIO for testing
+REPORT_S3_PREFIX = os.getenv("REPORT_S3_PREFIX", "reports/")  # keys the app owns (and the sweeper may delete)
+REPORTS_PUBLIC_URL = os.getenv("REPORTS_PUBLIC_URL")  # e.g. https://api.example.com; defaults to the request's base URL
+REPORT_URL_TTL = int(os.getenv("REPORT_URL_TTL", str(24 * 3600)))
+REPORT_RETENTION_DAYS = float(os.getenv("REPORT_RETENTION_DAYS", "0"))  # 0 keeps reports forever
+REPORT_SWEEP_INTERVAL = int(os.getenv("REPORT_SWEEP_INTERVAL", "3600"))
+REPORT_IO_WORKERS = int(os.getenv("REPORT_IO_WORKERS", "4"))  # threads for blocking file / S3 reads
+CHUNK_SIZE = 256 * 1024
+
+
+class ObjectInfo:
+    def __init__(self, key, size, modified, etag):
+        self.key = key
+        self.size = size
+        self.modified = modified
+        self.etag = etag
+
+
+class LocalStorage:
+    def __init__(self, root=REPORTS_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise KeyError(key)
+        return path
+
+    def put(self, key, data, content_type="application/pdf"):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self._path(key))
+        except (OSError, KeyError):
+            return None
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        return ObjectInfo(key, st.st_size, st.st_mtime, etag)
+
+    def iter_range(self, key, start, end):
+        """Yield bytes [start, end] (inclusive) in chunks."""
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def list(self):
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                key = os.path.relpath(os.path.join(root, name), self.root).replace(os.sep, "/")
+                info = self.stat(key)
+                if info:
+                    yield info
+
+    def compact(self):
+        # Drop directories left empty after deletions
+        for root, dirs, names in os.walk(self.root, topdown=False):
+            if root != self.root and not dirs and not names:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+
+class S3Storage:
+    def __init__(self, bucket=REPORT_S3_BUCKET, endpoint_url=REPORT_S3_ENDPOINT_URL, prefix=REPORT_S3_PREFIX):
+        import boto3
+        from botocore.exceptions import ClientError
+        self._client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def put(self, key, data, content_type="application/pdf"):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error:
+            return None
+        return ObjectInfo(key, head["ContentLength"], head["LastModified"].timestamp(), head["ETag"])
+
+    def iter_range(self, key, start, end):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key, Range=f"bytes={start}-{end}")
+        yield from response["Body"].iter_chunks(CHUNK_SIZE)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def list(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield ObjectInfo(obj["Key"][len(self.prefix):], obj["Size"], obj["LastModified"].timestamp(), obj["ETag"])
+
+    def compact(self):
+        pass
+
+
+def create_storage():
+    return S3Storage() if REPORT_STORAGE == "s3" else LocalStorage()
+
+
+report_storage = create_storage()
+
+
+def check_storage_config():
+    """Called at startup: refuse settings that would make links forgeable or let the sweeper
+    delete objects this app doesn't own."""
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY must be set; it signs report download links")
+    if REPORT_RETENTION_DAYS and isinstance(report_storage, S3Storage) and not report_storage.prefix:
+        raise RuntimeError("REPORT_RETENTION_DAYS needs a non-empty REPORT_S3_PREFIX; "
+                           "the sweeper deletes every expired object under it")
+
+
+# ---------- Async access ----------
+# Downloads read through their own small pool, so slow disks or S3 never hold the event loop
+# or the threads the rest of the app relies on.
+
+_io_executor = ThreadPoolExecutor(max_workers=REPORT_IO_WORKERS, thread_name_prefix="report-io")
+
+
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, fn, *args)
+
+
+async def aiter_range(key, start, end, storage=None):
+    """Async version of storage.iter_range(): each chunk is read on the report I/O pool."""
+    chunks = (storage or report_storage).iter_range(key, start, end)
+    try:
+        while True:
+            chunk = await run_io(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Closes the file (or S3 body) on the pool too, also when the client disconnects early
+        await run_io(chunks.close)
+
+
+def shutdown_io():
+    _io_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- Signed URLs ----------
+
+def _signature(key, expires):
+    message = f"{key}:{expires}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def signed_report_url(key, base_url, ttl=REPORT_URL_TTL):
+    expires = int(time.time()) + ttl
+    base = (REPORTS_PUBLIC_URL or base_url).rstrip("/")
+    return f"{base}/reports/{quote(key)}?expires={expires}&sig={_signature(key, expires)}"
+
+
+def verify_signature(key, expires, sig):
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(key, expires), sig)
+
+
+# ---------- Retention ----------
+
+def sweep_reports(storage=None, retention_days=REPORT_RETENTION_DAYS):
+    storage = storage or report_storage
+    cutoff = time.time() - retention_days * 86400
+    removed = 0
+    for info in list(storage.list()):
+        # Also clears half-written uploads and DOCX intermediates left by crashed workers
+        stale_temp = info.key.endswith((".tmp", ".docx")) and info.modified < time.time() - 3600
+        if info.modified < cutoff or stale_temp:
+            storage.delete(info.key)
+            removed += 1
+    storage.compact()
+    return removed
+
+
+async def run_retention_sweeper(interval=REPORT_SWEEP_INTERVAL):
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_reports)
+            if removed:
+                print(f"[INFO] Report sweeper removed {removed} expired object(s)")
+        except Exception as e:
+            print("[ERROR] Report sweeper failed:", str(e))
+        await asyncio.sleep(interval)
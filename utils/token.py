@@ -1,17 +1,98 @@
-from fastapi import Header, HTTPException
-from jose import jwt
+import os
+import time
+import threading
+from collections import OrderedDict
+from fastapi import Header, HTTPException, Depends
+from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
 from config import SECRET_KEY, ALGORITHM
+from db import async_connection
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def get_current_user_from_token(authorization: str = Header(...)):
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
+_claims_cache = OrderedDict()  # token -> verified claims, kept until the token's exp
+_claims_lock = threading.Lock()
+_user_cache = OrderedDict()  # email -> (expires_at, {"id", "email", "role"}), least recently used first
+_user_lock = threading.Lock()
+
+def decode_token(token: str):
+    now = time.time()
+    with _claims_lock:
+        claims = _claims_cache.get(token)
+        if claims is not None:
+            if claims.get("exp", 0) > now:
+                _claims_cache.move_to_end(token)
+                return claims
+            del _claims_cache[token]
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    with _claims_lock:
+        _claims_cache[token] = claims
+        while len(_claims_cache) > AUTH_CLAIMS_CACHE_SIZE:
+            _claims_cache.popitem(last=False)
+    return claims
+
+async def get_current_claims(token: str = Depends(oauth2_scheme)):
+    # async so FastAPI calls it on the loop instead of hopping to the threadpool; decoding is cached
+    try:
+        claims = decode_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return claims
+
+def _cached_user(email):
+    with _user_lock:
+        entry = _user_cache.get(email)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _user_cache[email]
+            return None
+        _user_cache.move_to_end(email)
+        return entry[1]
+
+async def get_current_user(claims: dict = Depends(get_current_claims)):
+    """The caller's id, email and role, served from a short TTL cache instead of a users lookup per request.
+
+    A connection is only borrowed on a miss, and returned before the route takes its own.
+    """
+    email = claims["sub"]
+    user = _cached_user(email)
+    if user is not None:
+        return user
+
+    async with async_connection() as conn:
+        cursor = await conn.cursor(dictionary=True)
+        await cursor.execute("SELECT id, email, role FROM users WHERE email = %s", (email,))
+        user = await cursor.fetchone()
+        await cursor.close()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    with _user_lock:
+        _user_cache[email] = (time.monotonic() + AUTH_USER_CACHE_TTL, user)
+        _user_cache.move_to_end(email)
+        while len(_user_cache) > AUTH_USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return user
+
+def invalidate_user(email: str):
+    with _user_lock:
+        _user_cache.pop(email, None)
+
+async def get_current_user_from_token(authorization: str = Header(...)):
     try:
         scheme, token = authorization.split()
         if scheme.lower() != "bearer":
             raise HTTPException(status_code=403, detail="Invalid scheme")
 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         return payload.get("sub")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")